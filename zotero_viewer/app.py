@@ -1,234 +1,89 @@
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, g, abort
 import sys, os
 import re
-from collections import defaultdict
-import functools
-from datetime import datetime
+import atexit
 import click
+from .library import LibraryManager
+from .loader import default_workers
+from .export import EXPORT_FORMATS, iter_export
 
 # Create Flask application
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY') or os.urandom(24)
 
 # Global variables
-database_path = None
-conn = None
-all_items = []
+libraries = None  # LibraryManager, set up in main()
 
-def get_items_and_tags(connection):
-    """Retrieve main items with metadata and tags using provided connection"""
-    cursor = connection.cursor()
-    
-    # First, get basic item information without authors
-    query = """
-    SELECT
-        items.itemID,
-        items.itemTypeID,
-        itemTypes.typeName,
-        itemDataValues.value AS title,
-        dateValues.value AS date,
-        items.dateAdded,
-        publicationValues.value AS publication,
-        abstractValues.value AS abstract,
-        tags.name AS tag
-    FROM items
-    LEFT JOIN itemTypes ON items.itemTypeID = itemTypes.itemTypeID
-    LEFT JOIN itemData ON items.itemID = itemData.itemID
-    LEFT JOIN fields ON itemData.fieldID = fields.fieldID
-    LEFT JOIN itemDataValues ON itemData.valueID = itemDataValues.valueID
-    LEFT JOIN itemTags ON items.itemID = itemTags.itemID
-    LEFT JOIN tags ON itemTags.tagID = tags.tagID
-    
-    -- Date field (publication date)
-    LEFT JOIN itemData dateData ON items.itemID = dateData.itemID AND dateData.fieldID = 14
-    LEFT JOIN itemDataValues dateValues ON dateData.valueID = dateValues.valueID
-    
-    -- Publication/Journal field
-    LEFT JOIN itemData pubData ON items.itemID = pubData.itemID AND pubData.fieldID = 12
-    LEFT JOIN itemDataValues publicationValues ON pubData.valueID = publicationValues.valueID
-    
-    -- Abstract field
-    LEFT JOIN itemData abstractData ON items.itemID = abstractData.itemID AND abstractData.fieldID = 90
-    LEFT JOIN itemDataValues abstractValues ON abstractData.valueID = abstractValues.valueID
-    
-    WHERE items.itemTypeID != 14 and items.itemTypeID != 1 and items.itemTypeID != 37  -- Exclude attachments, notes, and annotations
-    AND (fields.fieldName = 'title' OR fields.fieldName IS NULL)
-    """
-    cursor.execute(query)
-    
-    items_dict = {}
-    for row in cursor.fetchall():
-        item_id = row['itemID']
-        if item_id not in items_dict:
-            # Format the date field to a readable format
-            date = row['date']
-            if date:
-                datestr = date.split(' ')[0]
-                Y, m, d = datestr.split('-')
-                if m == '00' and d == '00':
-                    date = Y
-                elif d == '00':
-                    date = f"{Y}-{m}"
-                else:
-                    date = f"{Y}-{m}-{d}"
-
-            # Format the dateAdded field to a readable format
-            date_added = row['dateAdded']
-            if date_added:
-                # Convert from Zotero's format (2023-01-01 12:00:00) to readable format
-                try:
-                    dt = datetime.strptime(date_added, '%Y-%m-%d %H:%M:%S')
-                    date_added = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    # If parsing fails, keep the original format
-                    pass
-            
-            items_dict[item_id] = {
-                'id': item_id,
-                'typeID': row['itemTypeID'],
-                'typeName': row['typeName'] or 'Unknown Type',
-                'title': row['title'] or 'Untitled',
-                'author': [],  # Initialize as empty list to store multiple authors
-                'date': date or 'No date',
-                'dateAdded': date_added or 'Unknown',
-                'publication': row['publication'] or '',
-                'abstract': row['abstract'] or '',  # Store abstract but don't display yet
-                'tags': set()
-            }
-        if row['tag']:
-            items_dict[item_id]['tags'].add(row['tag'])
-    
-    # Now get all authors for each item
-    author_query = """
-    SELECT
-        items.itemID,
-        creators.firstName,
-        creators.lastName,
-        creatorTypes.creatorType
-    FROM items
-    JOIN itemCreators ON items.itemID = itemCreators.itemID
-    JOIN creators ON itemCreators.creatorID = creators.creatorID
-    JOIN creatorTypes ON itemCreators.creatorTypeID = creatorTypes.creatorTypeID
-    WHERE items.itemTypeID != 14 and items.itemTypeID != 1 and items.itemTypeID != 37  -- Exclude attachments, notes, and annotations
-    ORDER BY items.itemID, itemCreators.orderIndex
-    """
-    cursor.execute(author_query)
-    
-    for row in cursor.fetchall():
-        item_id = row['itemID']
-        if item_id in items_dict:
-            first_name = row['firstName'] or ''
-            last_name = row['lastName'] or ''
-            
-            # Format the author name based on available parts
-            if first_name and last_name:
-                author_name = f"{first_name} {last_name}"
-            elif last_name:
-                author_name = last_name
-            elif first_name:
-                author_name = first_name
-            else:
-                author_name = "Unknown author"
-                
-            # Add the author to the list
-            items_dict[item_id]['author'].append(author_name)
-    
-    # For items with no authors, set a default value
-    for item in items_dict.values():
-        if not item['author']:
-            item['author'] = ['Unknown author']
-    
-    # Convert sets to lists for easier template handling
-    for item in items_dict.values():
-        item['tags'] = list(item['tags'])
-    
-    return list(items_dict.values())
-
-# Decorator for database transactions
-def with_transaction(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect(database_path)
-        conn.row_factory = sqlite3.Row
-        try:
-            result = func(conn, *args, **kwargs)  # Pass connection to wrapped function
-            conn.commit()
-            return result
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
-    return wrapper
-
-# Update the add_tag_to_items function to use the connection passed by the decorator
-@with_transaction
-def add_tag_to_items(conn, tag_name, item_ids):  # Accept conn as first parameter
-    cursor = conn.cursor()
-    
-    # Get or create tag
-    cursor.execute("SELECT tagID FROM tags WHERE name = ?", (tag_name,))
-    result = cursor.fetchone()
-    if result:
-        tag_id = result['tagID']
-    else:
-        cursor.execute("INSERT INTO tags (name) VALUES (?)", (tag_name,))
-        tag_id = cursor.lastrowid
-
-    # Insert associations using executemany for better performance
-    existing_links = cursor.execute("""
-        SELECT itemID, tagID FROM itemTags
-        WHERE tagID = ? AND itemID IN ({})
-        """.format(','.join('?'*len(item_ids))),
-        [tag_id] + item_ids
-    ).fetchall()
-
-    existing_item_ids = {row['itemID'] for row in existing_links}
-    new_associations = [
-        (item_id, tag_id, 0)  # Adding default type value of 0
-        for item_id in item_ids
-        if int(item_id) not in existing_item_ids
-    ]
-
-    if new_associations:
-        cursor.executemany(
-            "INSERT INTO itemTags (itemID, tagID, type) VALUES (?, ?, ?)",
-            new_associations
-        )
+# Every library-scoped route is served both at the root, for the default library,
+# and under /library/<library_key>/ for any library.
+def library_route(rule, **options):
+    def decorator(func):
+        app.add_url_rule(rule, view_func=func, **options)
+        app.add_url_rule('/library/<library_key>' + rule, view_func=func, **options)
+        return func
+    return decorator
 
-    # Update in-memory data with fresh database state
-    global all_items
-    conn_refresh = sqlite3.connect(database_path)
-    conn_refresh.row_factory = sqlite3.Row
-    all_items = get_items_and_tags(conn_refresh)
-    conn_refresh.close()
-
-# Add a new function to remove tags from items
-@with_transaction
-def remove_tag_from_item(conn, tag_name, item_id):  # Accept conn as first parameter
-    cursor = conn.cursor()
-    
-    # Get tag ID
-    cursor.execute("SELECT tagID FROM tags WHERE name = ?", (tag_name,))
-    result = cursor.fetchone()
-    if not result:
-        return False  # Tag doesn't exist
-    
-    tag_id = result['tagID']
-    
-    # Remove the association
-    cursor.execute(
-        "DELETE FROM itemTags WHERE itemID = ? AND tagID = ?",
-        (item_id, tag_id)
-    )
-    
-    # No need to update all_items here, we'll do it in the route handler
-    
-    return True
+@app.url_value_preprocessor
+def pull_library_key(endpoint, values):
+    g.library_key = values.pop('library_key', None) if values else None
+
+@app.url_defaults
+def add_library_key(endpoint, values):
+    # Links built while serving a library stay within that library
+    if g.get('library_key') and 'library_key' not in values \
+            and app.url_map.is_endpoint_expecting(endpoint, 'library_key'):
+        values['library_key'] = g.library_key
+
+def get_library():
+    """Get the library of the current request, loading it if needed; it stays in use until the request ends"""
+    library = g.get('library')
+    if library is None:
+        library = libraries.acquire(g.get('library_key') or libraries.default_key)
+        if library is None:
+            abort(404)
+        g.library = library
+    return library
+
+@app.before_request
+def resolve_library():
+    # Resolve (and load) the library up front, so an unknown library is a plain 404
+    if request.endpoint and app.url_map.is_endpoint_expecting(request.endpoint, 'library_key'):
+        get_library()
+
+@app.teardown_request
+def release_library(exception):
+    library = g.pop('library', None)
+    if library is not None:
+        libraries.release(library)
+
+def hold_library(response):
+    """Keep the request's library in use until a streamed response is closed, not just until the request ends"""
+    library = g.pop('library')
+    response.call_on_close(lambda: libraries.release(library))
+    return response
+
+def item_matches_search(item, search_terms):
+    """Match the item search of the web page: every term must occur in the item's text"""
+    text = ' '.join([
+        item['title'],
+        ', '.join(item['author']),
+        item['publication'],
+        item['date'],
+        item['dateAdded'],
+        ' '.join(item['tags'])
+    ]).lower()
+    return all(term in text for term in search_terms)
+
+def iter_filtered_items(items, selected_tags, search):
+    """Lazily yield the items that contain ALL selected tags and match the search"""
+    search_terms = [term.strip().lower() for term in re.split(r'[,;]', search) if term.strip()]
+    for item in items:
+        if all(tag in item['tags'] for tag in selected_tags) and item_matches_search(item, search_terms):
+            yield item
 
 # Routes
-@app.route('/', methods=['GET', 'POST'])
+@library_route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
         new_tags_input = request.form.get('new_tag', '').strip()
@@ -261,15 +116,9 @@ def index():
         
         try:
             # Process each tag separately
+            library = get_library()
             for tag_name in new_tags:
-                add_tag_to_items(tag_name, selected_items)
-            
-            # Force reload all_items from database
-            global all_items
-            refresh_conn = sqlite3.connect(database_path)
-            refresh_conn.row_factory = sqlite3.Row
-            all_items = get_items_and_tags(refresh_conn)
-            refresh_conn.close()
+                library.add_tag_to_items(tag_name, selected_items)
             
             if len(new_tags) == 1:
                 flash(f'Added tag "{new_tags[0]}" to {len(selected_items)} items', 'success')
@@ -296,29 +145,37 @@ def index():
     else:
         # GET request handling remains unchanged
         selected_tags = request.args.getlist('tag')
+        library = get_library()
+        
+        # Read the generation first, clients replay anything published while we render
+        generation = library.broker.generation
         
         # Filter items that contain ALL selected tags
+        all_items = library.items
         filtered_items = [
             item for item in all_items
             if all(tag in item['tags'] for tag in selected_tags)
         ] if selected_tags else all_items
         
         # Create tag cloud with counts for current selection
-        tag_counts = defaultdict(int)
-        for item in filtered_items:
-            for tag in item['tags']:
-                tag_counts[tag] += 1
+        tag_counts = library.get_tag_counts(selected_tags)
         
         return render_template(
             'index.html',
             items=filtered_items,
             tag_counts=tag_counts,
-            selected_tags=selected_tags
+            related_tags=library.related_tags(selected_tags) if selected_tags else [],
+            selected_tags=selected_tags,
+            generation=generation,
+            library=library,
+            libraries=list(libraries.libraries.values()),
+            # Prefix of this library's routes, used by the scripts ('' for the default library)
+            base_url=url_for('index').rstrip('/')
         )
 
 # Add a new route to handle tag removal
 # Update the remove_tag route to return JSON
-@app.route('/remove_tag', methods=['POST'])
+@library_route('/remove_tag', methods=['POST'])
 def remove_tag():
     tag_name = request.form.get('tag_name')
     item_id = request.form.get('item_id')
@@ -331,31 +188,15 @@ def remove_tag():
     
     try:
         item_id = int(item_id)
-        # The decorated function will receive conn as first parameter
-        success = remove_tag_from_item(tag_name, item_id)
+        library = get_library()
+        success = library.remove_tag_from_item(tag_name, item_id)
         
         if success:
-            # Force reload of all items data from the database
-            global all_items
-            refresh_conn = sqlite3.connect(database_path)
-            refresh_conn.row_factory = sqlite3.Row
-            all_items = get_items_and_tags(refresh_conn)
-            refresh_conn.close()
-            
             # Get the current selected tags from the request
             selected_tags = request.form.getlist('selected_tags')
             
-            # Filter items that contain ALL selected tags
-            filtered_items = [
-                item for item in all_items
-                if all(tag in item['tags'] for tag in selected_tags)
-            ] if selected_tags else all_items
-            
             # Create tag cloud with counts for current selection
-            tag_counts = defaultdict(int)
-            for item in filtered_items:
-                for tag in item['tags']:
-                    tag_counts[tag] += 1
+            tag_counts = library.get_tag_counts(selected_tags)
             
             return jsonify({
                 'success': True,
@@ -365,7 +206,7 @@ def remove_tag():
         else:
             return jsonify({
                 'success': False,
-                'message': f'Tag "{tag_name}" not found'
+                'message': f'Tag "{tag_name}" not found on item'
             })
     except Exception as e:
         return jsonify({
@@ -374,7 +215,7 @@ def remove_tag():
         })
 
 # Add a new route to handle batch tag removal
-@app.route('/remove_tag_batch', methods=['POST'])
+@library_route('/remove_tag_batch', methods=['POST'])
 def remove_tag_batch():
     tag_name = request.form.get('tag_name')
     item_ids = request.form.getlist('item_ids')
@@ -388,31 +229,11 @@ def remove_tag_batch():
     
     try:
         item_ids = [int(item_id) for item_id in item_ids]
-        success_count = 0
-        
-        # Process each item ID
-        for item_id in item_ids:
-            if remove_tag_from_item(tag_name, item_id):
-                success_count += 1
-        
-        # Force reload of all items data from the database
-        global all_items
-        refresh_conn = sqlite3.connect(database_path)
-        refresh_conn.row_factory = sqlite3.Row
-        all_items = get_items_and_tags(refresh_conn)
-        refresh_conn.close()
-        
-        # Filter items that contain ALL selected tags
-        filtered_items = [
-            item for item in all_items
-            if all(tag in item['tags'] for tag in selected_tags)
-        ] if selected_tags else all_items
+        library = get_library()
+        success_count = len(library.remove_tag_from_items(tag_name, item_ids))
         
         # Create tag cloud with counts for current selection
-        tag_counts = defaultdict(int)
-        for item in filtered_items:
-            for tag in item['tags']:
-                tag_counts[tag] += 1
+        tag_counts = library.get_tag_counts(selected_tags)
         
         if success_count > 0:
             return jsonify({
@@ -434,7 +255,7 @@ def remove_tag_batch():
     # Redirect back to the current page with any existing filter parameters
     return redirect(request.referrer or url_for('index'))
 
-@app.route('/get_attachment/<item_id>')
+@library_route('/get_attachment/<item_id>')
 def get_attachment(item_id):
     try:
         # Get the attachment path from the database
@@ -479,38 +300,26 @@ def get_attachment(item_id):
             'message': f'Error retrieving attachment: {str(e)}'
         })
 
-# Use the with_transaction decorator like other functions
-@with_transaction
-def get_attachment_path_for_item(conn, item_id):
+def get_attachment_path_for_item(item_id):
     """Get the file path for a PDF attachment associated with an item"""
     try:
-        cursor = conn.cursor()
+        # Attachment metadata is loaded with the items
+        item = get_library().items_by_id.get(int(item_id))
+        attachments = item['attachments'] if item else []
         
-        # Query to find PDF attachments for the given item
-        query = """
-        SELECT
-            items.key AS item_key,
-            itemAttachments.path AS attachment_path,
-            itemAttachments.contentType AS content_type,
-            itemAttachments.linkMode AS link_mode
-        FROM items
-        JOIN itemAttachments ON items.itemID = itemAttachments.itemID
-        WHERE itemAttachments.parentItemID = ?
-        AND (itemAttachments.contentType = 'application/pdf' 
-             OR itemAttachments.contentType LIKE '%pdf%'
-             OR itemAttachments.path LIKE '%.pdf')
-        LIMIT 1
-        """
-        
-        cursor.execute(query, (item_id,))
-        result = cursor.fetchone()
+        # Find the first PDF attachment of the item
+        result = next((
+            attachment for attachment in attachments
+            if 'pdf' in (attachment['contentType'] or '').lower()
+            or (attachment['path'] or '').lower().endswith('.pdf')
+        ), None)
         
         if not result:
             print(f"No attachment found for item {item_id}")
             return None
         
-        attachment_path = result['attachment_path']
-        link_mode = result['link_mode']
+        attachment_path = result['path']
+        link_mode = result['linkMode']
         
         # Handle link_mode 2 (linked URL) - typically used by ZotFile with custom locations
         if link_mode == 2:
@@ -528,10 +337,8 @@ def get_attachment_path_for_item(conn, item_id):
     except Exception as e:
         print(f"Error getting attachment path: {str(e)}")
         return None
-    # Remove the finally block that closes the connection
-    # The with_transaction decorator will handle closing the connection
 
-@app.route('/rename_tag', methods=['POST'])
+@library_route('/rename_tag', methods=['POST'])
 def rename_tag():
     data = request.json
     old_tag_name = data.get('old_tag_name')
@@ -543,18 +350,16 @@ def rename_tag():
             'message': 'Missing old or new tag name'
         })
     
+    if old_tag_name == new_tag_name:
+        return jsonify({
+            'success': False,
+            'message': 'New tag name is the same as the old one'
+        })
+    
     try:
-        # Create a new function to handle tag renaming
-        success = rename_tag_in_database(old_tag_name, new_tag_name)
+        success = get_library().rename_tag(old_tag_name, new_tag_name)
         
         if success:
-            # Force reload of all items data from the database
-            global all_items
-            refresh_conn = sqlite3.connect(database_path)
-            refresh_conn.row_factory = sqlite3.Row
-            all_items = get_items_and_tags(refresh_conn)
-            refresh_conn.close()
-            
             return jsonify({
                 'success': True,
                 'message': f'Renamed tag "{old_tag_name}" to "{new_tag_name}"'
@@ -570,56 +375,11 @@ def rename_tag():
             'message': f'Error renaming tag: {str(e)}'
         })
 
-@with_transaction
-def rename_tag_in_database(conn, old_tag_name, new_tag_name):
-    cursor = conn.cursor()
-    
-    # Check if the old tag exists
-    cursor.execute("SELECT tagID FROM tags WHERE name = ?", (old_tag_name,))
-    old_tag_result = cursor.fetchone()
-    if not old_tag_result:
-        return False  # Old tag doesn't exist
-    
-    old_tag_id = old_tag_result['tagID']
-    
-    # Check if the new tag already exists
-    cursor.execute("SELECT tagID FROM tags WHERE name = ?", (new_tag_name,))
-    new_tag_result = cursor.fetchone()
-    
-    if new_tag_result:
-        # New tag already exists, need to merge tags
-        new_tag_id = new_tag_result['tagID']
-        
-        # Get all items with the old tag
-        cursor.execute("SELECT itemID FROM itemTags WHERE tagID = ?", (old_tag_id,))
-        items_with_old_tag = [row['itemID'] for row in cursor.fetchall()]
-        
-        # For each item with the old tag, check if it already has the new tag
-        for item_id in items_with_old_tag:
-            cursor.execute("SELECT * FROM itemTags WHERE itemID = ? AND tagID = ?", 
-                          (item_id, new_tag_id))
-            if not cursor.fetchone():
-                # Item doesn't have the new tag yet, add it
-                cursor.execute("INSERT INTO itemTags (itemID, tagID, type) VALUES (?, ?, 0)",
-                              (item_id, new_tag_id))
-        
-        # Delete all associations with the old tag
-        cursor.execute("DELETE FROM itemTags WHERE tagID = ?", (old_tag_id,))
-        
-        # Delete the old tag
-        cursor.execute("DELETE FROM tags WHERE tagID = ?", (old_tag_id,))
-    else:
-        # New tag doesn't exist, simply rename the old tag
-        cursor.execute("UPDATE tags SET name = ? WHERE tagID = ?", 
-                      (new_tag_name, old_tag_id))
-    
-    return True
-
-@app.route('/get_item_details/<item_id>')
+@library_route('/get_item_details/<item_id>')
 def get_item_details(item_id):
     try:
         # Find the item in our preloaded items
-        item = next((item for item in all_items if str(item['id']) == str(item_id)), None)
+        item = get_library().items_by_id.get(int(item_id))
         
         if item:
             return jsonify({
@@ -642,7 +402,7 @@ def get_item_details(item_id):
 # <script src="{{ url_for('static', filename='js/item-details.js') }}"></script>
 
 # Add a new route specifically for AJAX tag addition
-@app.route('/add_tags', methods=['POST'])
+@library_route('/add_tags', methods=['POST'])
 def add_tags():
     new_tags_input = request.form.getlist('new_tag')
     selected_items = request.form.getlist('selected_items')
@@ -680,28 +440,12 @@ def add_tags():
     
     try:
         # Process each tag separately
+        library = get_library()
         for tag_name in new_tags:
-            add_tag_to_items(tag_name=tag_name, item_ids=selected_items)
-        
-        # Force reload all_items from database
-        global all_items
-        refresh_conn = sqlite3.connect(database_path)
-        refresh_conn.row_factory = sqlite3.Row
-        all_items = get_items_and_tags(refresh_conn)
-        
-        # Filter items that contain ALL selected tags
-        filtered_items = [
-            item for item in all_items
-            if all(tag in item['tags'] for tag in selected_tags)
-        ] if selected_tags else all_items
+            library.add_tag_to_items(tag_name=tag_name, item_ids=selected_items)
         
         # Create tag cloud with counts for current selection
-        tag_counts = defaultdict(int)
-        for item in filtered_items:
-            for tag in item['tags']:
-                tag_counts[tag] += 1
-        
-        refresh_conn.close()
+        tag_counts = library.get_tag_counts(selected_tags)
         
         # Create success message
         if len(new_tags) == 1:
@@ -722,15 +466,11 @@ def add_tags():
         })
 
 # Add a new route to handle data refresh
-@app.route('/refresh_data', methods=['POST'])
+@library_route('/refresh_data', methods=['POST'])
 def refresh_data():
     try:
-        # Force reload of all items data from the database
-        global all_items
-        refresh_conn = sqlite3.connect(database_path)
-        refresh_conn.row_factory = sqlite3.Row
-        all_items = get_items_and_tags(refresh_conn)
-        refresh_conn.close()
+        # Force reload of all items data from the database (pending tag changes are written first)
+        get_library().load()
         
         # Get the current selected tags from the request
         selected_tags = request.form.getlist('selected_tags')
@@ -759,49 +499,136 @@ def refresh_data():
 
 
 @click.command()
-@click.argument('database', type=click.Path(exists=True))
+@click.argument('databases', nargs=-1, required=True, type=click.Path(exists=True))
 @click.option('--host', default='127.0.0.1', help='Host to bind the server to (default: 127.0.0.1)')
 @click.option('--port', default=5000, help='Port to bind the server to (default: 5000)')
 @click.option('--debug', is_flag=True, help='Run in debug mode (default: False)')
-def main(database, host, port, debug):
+@click.option('--flush-delay', default=0.2, help='Seconds to collect tag changes before writing them to the database (default: 0.2)')
+@click.option('--load-workers', 'workers', default=default_workers(), help='Number of parallel connections used to load the library (default: number of CPUs, at most 4)')
+@click.option('--memory-budget', default=1024, help='Megabytes of loaded library data to keep in memory before unloading idle libraries, 0 for no limit (default: 1024)')
+def main(databases, host, port, debug, flush_delay, workers, memory_budget):
     """Run the Zotero Viewer web application.
     
-    DATABASE: Path to your Zotero SQLite database file (required)
+    DATABASES: Path(s) to your Zotero SQLite database file(s) (at least one)
+    
+    The user library of the first database is served at /, every library
+    (including group libraries) at /library/<key>/, see /api/libraries.
     
     Example usage:
     
     zotero-viewer /path/to/zotero.sqlite
     
     zotero-viewer /path/to/zotero.sqlite --host 0.0.0.0 --port 8080 --debug
+    
+    zotero-viewer /path/to/zotero.sqlite /path/to/lab/zotero.sqlite --memory-budget 512
     """
-    global database_path, conn, all_items
+    global libraries
+    
+    libraries = LibraryManager(
+        memory_budget=memory_budget * 2**20 if memory_budget else None,
+        load_workers=workers,
+        flush_delay=flush_delay
+    )
+    for database in databases:
+        libraries.add_database(database)
     
-    database_path = database
-    conn = sqlite3.connect(database_path)
-    conn.row_factory = sqlite3.Row
+    # Make sure queued tag changes are written on exit
+    atexit.register(libraries.close)
     
-    # Load all items at startup
-    all_items = get_items_and_tags(conn)
+    # Load the default library at startup, the others are loaded on first access
+    libraries.release(libraries.acquire(libraries.default_key))
     
     # Run the Flask app
     app.run(host=host, port=port, debug=debug)
 
-@app.route('/api/tags')
+@library_route('/api/tags')
 def get_all_tags():
     """API endpoint to get all tags from the database"""
-    # Get all unique tags from the database
-    all_tags = set()
-    
-    # Extract tags from the already loaded items
-    for item in all_items:
-        if 'tags' in item:
-            for tag in item['tags']:
-                all_tags.add(tag)
+    # Library-wide counts are kept up to date with every tag change, no need to scan the items
+    tag_counts = get_library().get_tag_counts([])
     
     # Sort tags alphabetically
-    sorted_tags = sorted(list(all_tags))
+    sorted_tags = sorted(tag_counts)
     
-    return jsonify({'tags': sorted_tags})
+    return jsonify({'tags': sorted_tags, 'counts': tag_counts})
+
+@library_route('/api/related_tags')
+def get_related_tags():
+    """API endpoint to get the tags most often used together with the given tags"""
+    tags = request.args.getlist('tag')
+    limit = request.args.get('limit', 10, type=int)
+    related = get_library().related_tags(tags, limit)
+    return jsonify({'related': [{'tag': tag, 'count': count} for tag, count in related]})
+
+@library_route('/export')
+def export_items():
+    """Stream the items matching the tag filters (and optional search) as CSL-JSON, BibTeX or CSV"""
+    export_format = request.args.get('format', 'csljson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown export format "{export_format}"'
+        }), 400
+    
+    selected_tags = request.args.getlist('tag')
+    search = request.args.get('q', '')
+    
+    # Keep a reference to the current items, a data refresh swaps in a new list
+    library = get_library()
+    items = iter_filtered_items(library.items, selected_tags, search)
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return hold_library(Response(
+        iter_export(library.database_path, items, export_format),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="zotero-export.{extension}"'}
+    ))
+
+@library_route('/events')
+def events():
+    """Server-sent events stream of library changes"""
+    # Browsers send Last-Event-ID when reconnecting, the page passes its render generation on first connect
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    return hold_library(Response(
+        get_library().broker.stream(since),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    ))
+
+@library_route('/api/duplicates')
+def get_duplicates():
+    """API endpoint to list groups of likely duplicate items (similar titles, same authors)"""
+    try:
+        groups = get_library().find_duplicates()
+        return jsonify({
+            'success': True,
+            'groups': [
+                {
+                    'score': group['score'],
+                    'items': [
+                        {key: item[key] for key in ('id', 'title', 'author', 'date', 'publication', 'tags')}
+                        for item in group['items']
+                    ]
+                }
+                for group in groups
+            ]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error finding duplicates: {str(e)}'
+        })
+
+@library_route('/api/write_status')
+def get_write_status():
+    """API endpoint to report pending tag changes and the last database flush"""
+    return jsonify(get_library().writer.status())
+
+@app.route('/api/libraries')
+def get_libraries():
+    """API endpoint to list the served libraries, their load state and the memory budget"""
+    return jsonify(libraries.status())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,83 @@
+"""Sparse tag co-occurrence counts for related-tag suggestions."""
+
+import heapq
+from collections import defaultdict
+
+
+class TagCooccurrence:
+    """Sparse, symmetric tag x tag matrix of the number of items sharing two tags.
+
+    Built once from the loaded items and then updated incrementally on every
+    tag change, so related tags are looked up rather than counted per request.
+    Not thread-safe on its own: the owning Library mutates and reads it under
+    its lock.
+    """
+
+    def __init__(self, items=()):
+        self.counts = defaultdict(int)  # tag -> number of items
+        self.pairs = defaultdict(lambda: defaultdict(int))  # tag -> other tag -> number of items
+        for item in items:
+            tags = set(item['tags'])
+            for tag in tags:
+                self.counts[tag] += 1
+                row = self.pairs[tag]
+                for other in tags:
+                    if other != tag:
+                        row[other] += 1
+
+    def add(self, tag, other_tags):
+        """Record a tag added to an item that has `other_tags`"""
+        self.counts[tag] += 1
+        row = self.pairs[tag]
+        for other in other_tags:
+            if other != tag:
+                row[other] += 1
+                self.pairs[other][tag] += 1
+
+    def remove(self, tag, other_tags):
+        """Record a tag removed from an item that keeps `other_tags`"""
+        self._decrement(self.counts, tag)
+        if tag not in self.counts:
+            self.pairs.pop(tag, None)
+        row = self.pairs.get(tag)
+        for other in other_tags:
+            if other == tag:
+                continue
+            if row is not None:
+                self._decrement(row, other)
+            other_row = self.pairs.get(other)
+            if other_row is not None:
+                self._decrement(other_row, tag)
+
+    @staticmethod
+    def _decrement(counter, key):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def tag_counts(self, selected_tag=None):
+        """Item counts per tag, over all items or over the items having `selected_tag`"""
+        if selected_tag is None:
+            return dict(self.counts)
+        if selected_tag not in self.counts:
+            return {}
+        counts = dict(self.pairs.get(selected_tag, {}))
+        counts[selected_tag] = self.counts[selected_tag]
+        return counts
+
+    def related(self, tags, limit=10):
+        """Tags most often used together with `tags`, as (tag, items in common) pairs.
+
+        With several tags the counts are summed, tags used with all of them
+        rank highest. Ties go to the more common tag.
+        """
+        scores = defaultdict(int)
+        for tag in tags:
+            for other, count in self.pairs.get(tag, {}).items():
+                scores[other] += count
+        for tag in tags:
+            scores.pop(tag, None)
+        return heapq.nsmallest(
+            limit, scores.items(),
+            key=lambda entry: (-entry[1], -self.counts.get(entry[0], 0), entry[0])
+        )
@@ -0,0 +1,278 @@
+"""Near-duplicate detection over item titles and authors."""
+
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict, namedtuple
+
+# Words that carry no information about which work a title refers to
+STOPWORDS = frozenset(
+    'a an and are as at by for from in into is of on or the to with via'.split()
+)
+
+# Author/year blocks larger than this are skipped (e.g. "Unknown author")
+MAX_BLOCK = 200
+
+Signature = namedtuple('Signature', 'source tokens surnames first_surname year')
+
+
+def normalize_text(text):
+    """Lowercase ASCII-folded text"""
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def title_tokens(title):
+    return frozenset(
+        token for token in re.findall(r'[a-z0-9]+', normalize_text(title))
+        if token not in STOPWORDS
+    )
+
+
+def author_surnames(authors):
+    """Surnames of the formatted author names ('First Last')"""
+    surnames = []
+    for author in authors:
+        if author == 'Unknown author':
+            continue
+        words = re.findall(r'[a-z]+', normalize_text(author))
+        if words:
+            surnames.append(words[-1])
+    return surnames
+
+
+def make_signature(item):
+    surnames = author_surnames(item['author'])
+    year = re.match(r'\d{4}', item['date'])
+    return Signature(
+        source=(item['title'], tuple(item['author']), item['date']),
+        tokens=title_tokens(item['title']),
+        surnames=frozenset(surnames),
+        first_surname=surnames[0] if surnames else None,
+        year=int(year.group(0)) if year else None
+    )
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class DuplicateIndex:
+    """Incremental index of likely duplicate items.
+
+    Candidate pairs come from two blocking schemes, so that the library is
+    never compared pairwise:
+
+    - prefix filtering on normalized title tokens: with the tokens of every
+      title sorted rarest first, two titles with similarity >= threshold share
+      one of their first len - ceil(threshold * len) + 1 tokens, so only those
+      are indexed, and they are mostly rare
+    - items with the same first author surname and a publication year at most
+      one year apart (preprint and published version, repeated imports)
+
+    Candidates are then verified on title similarity and author overlap.
+    `update` only re-indexes items that were added, removed, or whose title,
+    authors or date changed, so refreshing the library is cheap. The token
+    order is fixed when the index is (re)built, as prefixes must use the same
+    order; tokens first seen later rank as rarest.
+    """
+
+    def __init__(self, threshold=0.8, related_threshold=0.6):
+        self.threshold = threshold  # Title similarity for any pair
+        self.related_threshold = related_threshold  # Title similarity for same first author, year +-1
+        self.signatures = {}
+        self.ranks = {}  # title token -> position in the token order, rarest first
+        self.prefixes = {}  # item ID -> indexed title tokens
+        self.sizes = {}  # item ID -> number of title tokens
+        self.postings = defaultdict(set)  # title token -> IDs of the items with the token in their prefix
+        self.blocks = defaultdict(set)  # (first author surname, year) -> item IDs
+        self.pairs = {}  # (smaller ID, larger ID) -> score
+        self.neighbors = defaultdict(set)  # item ID -> IDs it is paired with
+        self.lock = threading.Lock()
+        self._synced_items = None
+        self._groups = None
+
+    def update(self, items):
+        """Bring the index in line with a list of items; return counts of what changed"""
+        with self.lock:
+            if items is self._synced_items:
+                return {'added': 0, 'removed': 0, 'changed': 0}
+
+            current = {item['id']: item for item in items}
+            removed = [item_id for item_id in self.signatures if item_id not in current]
+            added, changed = [], []
+            for item_id, item in current.items():
+                signature = self.signatures.get(item_id)
+                if signature is None:
+                    added.append(item_id)
+                elif signature.source != (item['title'], tuple(item['author']), item['date']):
+                    changed.append(item_id)
+
+            signatures = {item_id: make_signature(current[item_id]) for item_id in added + changed}
+            if len(added) + len(changed) > len(self.signatures) // 2:
+                # Mostly new items, rebuild all of them with a token order fitted to the library
+                for item_id in current:
+                    if item_id not in signatures:
+                        signatures[item_id] = self.signatures[item_id]
+                self._reset(signatures)
+                indexed = list(current)
+            else:
+                for item_id in removed + changed:
+                    self._remove(item_id)
+                indexed = added + changed
+            # Blocks first, so that their size caps don't depend on the order of the items
+            for item_id in indexed:
+                key = self._block_key(signatures[item_id])
+                if key is not None:
+                    self.blocks[key].add(item_id)
+            for item_id in indexed:
+                # Matching before indexing compares every new pair once
+                prefix = self._prefix(signatures[item_id].tokens)
+                self._match(item_id, signatures[item_id], prefix)
+                self._add(item_id, signatures[item_id], prefix)
+
+            self._synced_items = items
+            if removed or added or changed:
+                self._groups = None
+            return {'added': len(added), 'removed': len(removed), 'changed': len(changed)}
+
+    def groups(self):
+        """Groups of likely duplicates (connected pairs), largest and most similar first"""
+        with self.lock:
+            if self._groups is None:
+                self._groups = self._build_groups()
+            return self._groups
+
+    # Internals
+
+    def _block_key(self, signature, year_offset=0):
+        if signature.first_surname is None or signature.year is None:
+            return None
+        return (signature.first_surname, signature.year + year_offset)
+
+    def _reset(self, signatures):
+        """Empty the index and order the tokens by how many of the given items use them"""
+        self.signatures = {}
+        self.prefixes = {}
+        self.sizes = {}
+        self.postings = defaultdict(set)
+        self.blocks = defaultdict(set)
+        self.pairs = {}
+        self.neighbors = defaultdict(set)
+        frequencies = defaultdict(int)
+        for signature in signatures.values():
+            for token in signature.tokens:
+                frequencies[token] += 1
+        self.ranks = {token: rank for rank, token in enumerate(sorted(frequencies, key=frequencies.get))}
+
+    def _prefix(self, tokens):
+        for token in tokens:
+            if token not in self.ranks:
+                self.ranks[token] = -len(self.ranks) - 1  # Unseen so far, rarer than all others
+        ordered = sorted(tokens, key=self.ranks.__getitem__)
+        return ordered[:len(ordered) - math.ceil(self.threshold * len(ordered)) + 1]
+
+    def _add(self, item_id, signature, prefix):
+        self.signatures[item_id] = signature
+        self.sizes[item_id] = len(signature.tokens)
+        self.prefixes[item_id] = prefix
+        for token in prefix:
+            self.postings[token].add(item_id)
+
+    def _remove(self, item_id):
+        signature = self.signatures.pop(item_id)
+        del self.sizes[item_id]
+        for token in self.prefixes.pop(item_id):
+            posting = self.postings[token]
+            posting.discard(item_id)
+            if not posting:
+                del self.postings[token]
+        key = self._block_key(signature)
+        if key is not None:
+            self.blocks[key].discard(item_id)
+            if not self.blocks[key]:
+                del self.blocks[key]
+        for other_id in self.neighbors.pop(item_id, ()):
+            self.pairs.pop((min(item_id, other_id), max(item_id, other_id)), None)
+            self.neighbors[other_id].discard(item_id)
+
+    def _candidates(self, item_id, signature, prefix):
+        # Indexed items sharing a prefix token, whose number of tokens allows a similarity >= threshold
+        candidates = set()
+        size = len(signature.tokens)
+        low, high = self.threshold * size, size / self.threshold
+        sizes = self.sizes
+        for token in prefix:
+            for other_id in self.postings.get(token, ()):
+                if low <= sizes[other_id] <= high:
+                    candidates.add(other_id)
+
+        # Indexed items by the same first author published within a year
+        for offset in (-1, 0, 1):
+            key = self._block_key(signature, offset)
+            block = self.blocks.get(key, ())
+            if len(block) <= MAX_BLOCK:
+                candidates.update(other_id for other_id in block if other_id in self.sizes)
+
+        candidates.discard(item_id)
+        return candidates
+
+    def _match(self, item_id, signature, prefix):
+        """Pair a new item with its duplicates among the indexed items"""
+        for other_id in self._candidates(item_id, signature, prefix):
+            score = self._score(signature, self.signatures[other_id])
+            if score is not None:
+                self.pairs[(min(item_id, other_id), max(item_id, other_id))] = score
+                self.neighbors[item_id].add(other_id)
+                self.neighbors[other_id].add(item_id)
+
+    def _score(self, a, b):
+        """Title similarity if the two items look like the same work, else None"""
+        similarity = jaccard(a.tokens, b.tokens)
+        if similarity < self.related_threshold:
+            return None
+
+        same_author = a.first_surname is not None and a.first_surname == b.first_surname
+        close_years = a.year is None or b.year is None or abs(a.year - b.year) <= 1
+        if similarity < self.threshold and not (same_author and close_years):
+            return None
+
+        # Known but disjoint author lists mean different works with similar titles
+        if a.surnames and b.surnames and not (a.surnames & b.surnames) and similarity < 0.95:
+            return None
+
+        # Very short titles ("Introduction", "Editorial") need agreeing authors and years
+        if min(len(a.tokens), len(b.tokens)) < 3 and not (same_author and close_years):
+            return None
+
+        return round(similarity, 3)
+
+    def _build_groups(self):
+        parent = {}
+
+        def find(item_id):
+            while parent.get(item_id, item_id) != item_id:
+                parent[item_id] = parent.get(parent[item_id], parent[item_id])
+                item_id = parent[item_id]
+            return item_id
+
+        for a, b in self.pairs:
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        members = defaultdict(set)
+        scores = defaultdict(list)
+        for (a, b), score in self.pairs.items():
+            root = find(a)
+            scores[root].append(score)
+            members[root].update((a, b))
+
+        groups = [
+            {'items': sorted(members[root]), 'score': min(scores[root])}
+            for root in members
+        ]
+        groups.sort(key=lambda group: (-len(group['items']), -group['score'], group['items'][0]))
+        return groups
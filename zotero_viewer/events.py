@@ -0,0 +1,98 @@
+"""Server-sent events broker for pushing library changes to open browser tabs."""
+
+import json
+import queue
+import threading
+from collections import deque
+
+
+class Subscription:
+    """Event queue of a single connected client"""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+
+class EventBroker:
+    """Publish change events tagged with an increasing generation number.
+
+    Recent events are kept in a backlog so that a client reconnecting with the
+    last generation it has seen (or a page rendered at a known generation) can
+    catch up. Clients that fall too far behind are told to resync instead.
+    """
+
+    def __init__(self, backlog_size=1000, queue_size=1000, heartbeat=15):
+        self.generation = 0
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._backlog = deque(maxlen=backlog_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event_type, data):
+        """Publish an event to all subscribers; return its generation"""
+        with self._lock:
+            self.generation += 1
+            event = (self.generation, event_type, data)
+            self._backlog.append(event)
+            for subscription in self._subscribers:
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    subscription.overflowed = True
+            return self.generation
+
+    def subscribe(self, since=None):
+        """Register a subscriber, replaying backlog events newer than `since`"""
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            if since is not None and since < self.generation:
+                oldest = self._backlog[0][0] if self._backlog else self.generation + 1
+                if since + 1 < oldest:
+                    # Some events are no longer in the backlog
+                    subscription.overflowed = True
+                else:
+                    for event in self._backlog:
+                        if event[0] > since:
+                            subscription.queue.put_nowait(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, since=None):
+        """Generate a text/event-stream response body for one client"""
+        subscription = self.subscribe(since)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                if subscription.overflowed:
+                    # The client missed events, drop what is queued and ask it to reload its view
+                    with self._lock:
+                        subscription.overflowed = False
+                        while not subscription.queue.empty():
+                            subscription.queue.get_nowait()
+                        generation = self.generation
+                    yield format_event(generation, 'resync', {})
+                    continue
+                try:
+                    event = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing the connection and detects gone clients
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(*event)
+        finally:
+            self.unsubscribe(subscription)
+
+
+def format_event(generation, event_type, data):
+    """Serialize an event in the text/event-stream format"""
+    return f"id: {generation}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
@@ -0,0 +1,307 @@
+"""Streaming export of items as CSL-JSON, BibTeX or CSV."""
+
+import csv
+import io
+import json
+import re
+import unicodedata
+from collections import defaultdict
+
+from .loader import connect_readonly
+
+# Number of items serialized per chunk (and per database round trip)
+CHUNK_SIZE = 500
+
+EXPORT_FORMATS = {
+    'csljson': ('application/vnd.citationstyles.csl+json', 'json'),
+    'bibtex': ('application/x-bibtex', 'bib'),
+    'csv': ('text/csv', 'csv'),
+}
+
+# Zotero item types to CSL types, anything else becomes 'document'
+CSL_TYPES = {
+    'journalArticle': 'article-journal',
+    'magazineArticle': 'article-magazine',
+    'newspaperArticle': 'article-newspaper',
+    'preprint': 'article',
+    'book': 'book',
+    'bookSection': 'chapter',
+    'conferencePaper': 'paper-conference',
+    'thesis': 'thesis',
+    'report': 'report',
+    'webpage': 'webpage',
+    'blogPost': 'post-weblog',
+    'manuscript': 'manuscript',
+    'patent': 'patent',
+    'dataset': 'dataset',
+    'computerProgram': 'software',
+}
+
+# Zotero fields to CSL variables
+CSL_FIELDS = {
+    'publicationTitle': 'container-title',
+    'bookTitle': 'container-title',
+    'proceedingsTitle': 'container-title',
+    'volume': 'volume',
+    'issue': 'issue',
+    'pages': 'page',
+    'publisher': 'publisher',
+    'place': 'publisher-place',
+    'DOI': 'DOI',
+    'ISBN': 'ISBN',
+    'ISSN': 'ISSN',
+    'url': 'URL',
+    'language': 'language',
+}
+
+# Zotero item types to BibTeX entry types, anything else becomes 'misc'
+BIBTEX_TYPES = {
+    'journalArticle': 'article',
+    'magazineArticle': 'article',
+    'newspaperArticle': 'article',
+    'book': 'book',
+    'bookSection': 'incollection',
+    'conferencePaper': 'inproceedings',
+    'thesis': 'phdthesis',
+    'report': 'techreport',
+    'manuscript': 'unpublished',
+}
+
+# Zotero fields to BibTeX fields
+BIBTEX_FIELDS = {
+    'volume': 'volume',
+    'issue': 'number',
+    'pages': 'pages',
+    'publisher': 'publisher',
+    'place': 'address',
+    'DOI': 'doi',
+    'ISBN': 'isbn',
+    'ISSN': 'issn',
+    'url': 'url',
+}
+
+BIBTEX_CONTAINER_FIELDS = {
+    'article': 'journal',
+    'incollection': 'booktitle',
+    'inproceedings': 'booktitle',
+}
+
+CSV_COLUMNS = [
+    'id', 'key', 'type', 'title', 'authors', 'date', 'publication', 'volume', 'issue',
+    'pages', 'DOI', 'url', 'tags', 'dateAdded', 'abstract'
+]
+
+
+def fetch_details(connection, item_ids):
+    """Fetch the fields not kept in memory (keys, all item fields, structured creators) for a chunk of items"""
+    placeholders = ','.join('?' * len(item_ids))
+    details = {item_id: {'key': None, 'fields': {}, 'creators': []} for item_id in item_ids}
+
+    for item_id, key in connection.execute(
+            f"SELECT itemID, key FROM items WHERE itemID IN ({placeholders})", item_ids):
+        details[item_id]['key'] = key
+
+    for item_id, field_name, value in connection.execute(f"""
+            SELECT itemData.itemID, fields.fieldName, itemDataValues.value
+            FROM itemData
+            JOIN fields ON itemData.fieldID = fields.fieldID
+            JOIN itemDataValues ON itemData.valueID = itemDataValues.valueID
+            WHERE itemData.itemID IN ({placeholders})
+            """, item_ids):
+        details[item_id]['fields'][field_name] = value
+
+    for item_id, first_name, last_name, creator_type in connection.execute(f"""
+            SELECT itemCreators.itemID, creators.firstName, creators.lastName, creatorTypes.creatorType
+            FROM itemCreators
+            JOIN creators ON itemCreators.creatorID = creators.creatorID
+            LEFT JOIN creatorTypes ON itemCreators.creatorTypeID = creatorTypes.creatorTypeID
+            WHERE itemCreators.itemID IN ({placeholders})
+            ORDER BY itemCreators.itemID, itemCreators.orderIndex
+            """, item_ids):
+        details[item_id]['creators'].append((first_name or '', last_name or '', creator_type or 'author'))
+
+    return details
+
+
+def get_year(item):
+    match = re.match(r'\d{4}', item['date'])
+    return match.group(0) if match else ''
+
+
+# CSL-JSON
+
+def to_csl(item, detail):
+    fields = detail['fields']
+    record = {
+        'id': detail['key'] or str(item['id']),
+        'type': CSL_TYPES.get(item['typeName'], 'document'),
+        'title': item['title'],
+    }
+
+    creators = defaultdict(list)
+    for first_name, last_name, creator_type in detail['creators']:
+        name = {'family': last_name, 'given': first_name} if first_name else {'literal': last_name}
+        creators[creator_type].append(name)
+    for creator_type in ('author', 'editor', 'translator'):
+        if creators[creator_type]:
+            record[creator_type] = creators[creator_type]
+
+    if item['date'] != 'No date':
+        parts = [int(part) for part in item['date'].split('-') if part.isdigit()]
+        record['issued'] = {'date-parts': [parts]} if parts else {'raw': item['date']}
+
+    for field_name, variable in CSL_FIELDS.items():
+        if fields.get(field_name) and variable not in record:
+            record[variable] = fields[field_name]
+    if fields.get('abstractNote'):
+        record['abstract'] = fields['abstractNote']
+    if item['tags']:
+        record['keyword'] = ', '.join(item['tags'])
+    return record
+
+
+def iter_csljson(chunks):
+    yield '['
+    first = True
+    for chunk in chunks:
+        records = [json.dumps(to_csl(item, detail), ensure_ascii=False) for item, detail in chunk]
+        if records:
+            yield ('\n' if first else ',\n') + ',\n'.join(records)
+            first = False
+    yield '\n]\n'
+
+
+# BibTeX
+
+# LaTeX special characters, replaced in a single pass so replacements aren't escaped again
+BIBTEX_ESCAPES = {
+    '\\': r'\textbackslash{}',
+    # BibTeX counts braces even when escaped, use commands so fields stay balanced
+    '{': r'\textbraceleft{}',
+    '}': r'\textbraceright{}',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+}
+
+
+def bibtex_escape(value):
+    """Escape a value for a {...} delimited field"""
+    return re.sub(r'[\\{}~^&%$#_]', lambda match: BIBTEX_ESCAPES[match.group(0)], str(value))
+
+
+def bibtex_key(item, detail, used_keys):
+    """Build an authorYearWord citation key, unique within this export"""
+    last_name = detail['creators'][0][1] if detail['creators'] else 'anon'
+    first_word = next((word for word in re.findall(r'\w+', item['title']) if len(word) > 3), '')
+    base = f"{last_name}{get_year(item)}{first_word}"
+    base = unicodedata.normalize('NFKD', base).encode('ascii', 'ignore').decode('ascii')
+    base = re.sub(r'[^A-Za-z0-9]', '', base).lower() or f"item{item['id']}"
+    # Count keys per base instead of probing, collisions are common in large libraries
+    suffix = used_keys[base]
+    used_keys[base] += 1
+    if suffix == 0:
+        return base
+    return f"{base}{chr(ord('a') + suffix - 1) if suffix <= 26 else suffix}"
+
+
+def to_bibtex(item, detail, used_keys):
+    fields = detail['fields']
+    entry_type = BIBTEX_TYPES.get(item['typeName'], 'misc')
+    entry = [('title', item['title'])]
+
+    for creator_type in ('author', 'editor'):
+        names = [f"{last_name}, {first_name}" if first_name else last_name
+                 for first_name, last_name, kind in detail['creators'] if kind == creator_type]
+        if names:
+            entry.append((creator_type, ' and '.join(names)))
+
+    if get_year(item):
+        entry.append(('year', get_year(item)))
+    if item['publication']:
+        entry.append((BIBTEX_CONTAINER_FIELDS.get(entry_type, 'howpublished'), item['publication']))
+    for field_name, bibtex_field in BIBTEX_FIELDS.items():
+        if fields.get(field_name):
+            entry.append((bibtex_field, fields[field_name]))
+    if fields.get('abstractNote'):
+        entry.append(('abstract', fields['abstractNote']))
+    if item['tags']:
+        entry.append(('keywords', ', '.join(item['tags'])))
+
+    body = ',\n'.join(f"  {name} = {{{bibtex_escape(value)}}}" for name, value in entry)
+    return f"@{entry_type}{{{bibtex_key(item, detail, used_keys)},\n{body}\n}}\n"
+
+
+def iter_bibtex(chunks):
+    used_keys = defaultdict(int)
+    for chunk in chunks:
+        yield '\n'.join(to_bibtex(item, detail, used_keys) for item, detail in chunk) + '\n'
+
+
+# CSV
+
+def to_csv_row(item, detail):
+    fields = detail['fields']
+    return [
+        item['id'],
+        detail['key'] or '',
+        item['typeName'],
+        item['title'],
+        '; '.join(item['author']),
+        item['date'],
+        item['publication'],
+        fields.get('volume', ''),
+        fields.get('issue', ''),
+        fields.get('pages', ''),
+        fields.get('DOI', ''),
+        fields.get('url', ''),
+        '; '.join(item['tags']),
+        item['dateAdded'],
+        fields.get('abstractNote', ''),
+    ]
+
+
+def iter_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(to_csv_row(item, detail) for item, detail in chunk)
+        yield buffer.getvalue()
+
+
+SERIALIZERS = {
+    'csljson': iter_csljson,
+    'bibtex': iter_bibtex,
+    'csv': iter_csv,
+}
+
+
+def iter_chunks(database_path, items, chunk_size):
+    """Group items into chunks, pairing each item with the details fetched for its chunk"""
+    connection = connect_readonly(database_path)
+    try:
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                details = fetch_details(connection, [item['id'] for item in chunk])
+                yield [(item, details[item['id']]) for item in chunk]
+                chunk = []
+        if chunk:
+            details = fetch_details(connection, [item['id'] for item in chunk])
+            yield [(item, details[item['id']]) for item in chunk]
+    finally:
+        connection.close()
+
+
+def iter_export(database_path, items, export_format, chunk_size=CHUNK_SIZE):
+    """Stream `items` (any iterable, consumed lazily) in the given format, one chunk of text at a time"""
+    return SERIALIZERS[export_format](iter_chunks(database_path, items, chunk_size))
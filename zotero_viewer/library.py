@@ -0,0 +1,386 @@
+"""In-memory models of Zotero libraries, loaded lazily and evicted under a memory budget."""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from .cooccurrence import TagCooccurrence
+from .duplicates import DuplicateIndex
+from .events import EventBroker
+from .loader import connect_readonly, get_items_and_tags
+from .writer import TagWriter
+
+# Reloads that tag changes keep overtaking give up after this many reads
+LOAD_ATTEMPTS = 5
+
+
+def estimate_size(*objects):
+    """Rough estimate, in bytes, of the memory held by objects.
+
+    Follows the elements of containers and the public attributes of other
+    objects. Only containers are tracked as already counted, so strings
+    shared by several of them are counted more than once.
+    """
+    size = 0
+    seen = set()
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+            size += sys.getsizeof(obj)
+            continue
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.extend(value for name, value in vars(obj).items() if not name.startswith('_'))
+    return size
+
+
+def discover_libraries(database_path):
+    """List (libraryID, type, name) of the user and group libraries in a Zotero database"""
+    connection = connect_readonly(database_path)
+    try:
+        rows = connection.execute("""
+            SELECT libraries.libraryID, libraries.type, groups.name
+            FROM libraries
+            LEFT JOIN groups ON groups.libraryID = libraries.libraryID
+            WHERE libraries.type IN ('user', 'group')
+            ORDER BY libraries.libraryID
+            """).fetchall()
+        libraries = [
+            (row['libraryID'], row['type'],
+             'My Library' if row['type'] == 'user' else (row['name'] or f"Group {row['libraryID']}"))
+            for row in rows
+        ]
+        return libraries or [(1, 'user', 'My Library')]
+    finally:
+        connection.close()
+
+
+class Library:
+    """In-memory model of one Zotero library.
+
+    Tag mutations are applied to the model immediately and written to the
+    database by the (per database) background writer. Both happen under the
+    library lock so that the order of queued operations matches the order of
+    in-memory changes, and every change is published to the library's event
+    broker.
+    """
+
+    def __init__(self, key, name, database_path, library_id, writer, load_workers=None):
+        self.key = key
+        self.name = name
+        self.database_path = database_path
+        self.library_id = library_id
+        self.writer = writer
+        self.load_workers = load_workers
+        self.broker = EventBroker()
+        self.duplicates = DuplicateIndex()
+        self.cooccurrence = TagCooccurrence()
+        self.lock = threading.RLock()
+        self.items = None
+        self.items_by_id = {}
+        self.data_size = 0  # Estimated at load: items, their index and the tag co-occurrence matrix
+        self.duplicates_size = 0  # Estimated after every update of the duplicate index
+        self.last_used = 0
+        self.in_use = 0
+        self.stale = False  # Set when tag changes could not be written, reloads on next access
+        self.generation = 0  # Incremented on every tag change
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.items is not None
+
+    @property
+    def size(self):
+        """Estimated memory held by the library, as of the last load (tag changes since aren't counted)"""
+        return self.data_size + self.duplicates_size
+
+    def ensure_loaded(self):
+        if not self.loaded or self.stale:
+            with self._load_lock:
+                if not self.loaded or self.stale:
+                    self._load()
+
+    def load(self):
+        """(Re)load the in-memory model from the database"""
+        with self._load_lock:
+            self._load()
+
+    def _load(self):
+        # Pending tag changes are written out first, otherwise the reload would lose them.
+        # Neither the flush nor the read hold the library lock, so requests aren't blocked
+        # while the database is busy. A tag change made in the meantime may or may not be
+        # in what was read, so the snapshot is only swapped in if there was none.
+        for attempt in range(LOAD_ATTEMPTS):
+            with self.lock:
+                generation = self.generation
+                self.stale = False
+            if not self.writer.flush(timeout=30):
+                raise RuntimeError('Pending tag changes could not be written, database may be locked')
+            items = get_items_and_tags(self.database_path, self.library_id, workers=self.load_workers)
+            items_by_id = {item['id']: item for item in items}
+            cooccurrence = TagCooccurrence(items)
+            data_size = estimate_size(items, items_by_id, cooccurrence)
+            with self.lock:
+                if self.generation != generation:
+                    continue
+                self.items = items
+                self.items_by_id = items_by_id
+                self.cooccurrence = cooccurrence
+                self.data_size = data_size
+                self.broker.publish('library_refreshed', {'items': len(items)})
+                break
+        else:
+            raise RuntimeError('Tags kept changing during the reload, try again')
+
+        # Bring the duplicate index up to date off the request path
+        threading.Thread(target=self._update_duplicates, args=(self.duplicates, items),
+                         name='zotero-viewer-duplicates', daemon=True).start()
+
+    def _update_duplicates(self, duplicates, items):
+        duplicates.update(items)
+        with duplicates.lock:
+            size = estimate_size(duplicates)
+        if duplicates is self.duplicates:  # Not unloaded in the meantime
+            self.duplicates_size = size
+
+    def unload(self):
+        """Drop the in-memory model, it is loaded again on next access"""
+        with self.lock:
+            self.items = None
+            self.items_by_id = {}
+            self.data_size = 0
+            self.duplicates_size = 0
+            self.duplicates = DuplicateIndex()
+            self.cooccurrence = TagCooccurrence()
+
+    def status(self):
+        return {
+            'key': self.key,
+            'name': self.name,
+            'database': self.database_path,
+            'libraryID': self.library_id,
+            'loaded': self.loaded,
+            'items': len(self.items) if self.loaded else None,
+            'size_mb': round(self.size / 2**20, 1),
+            'in_use': self.in_use
+        }
+
+    def get_tag_counts(self, selected_tags):
+        """Count tags over the items that contain ALL selected tags"""
+        if len(selected_tags) <= 1:
+            # No need to scan the items, the counts are a row of the co-occurrence matrix
+            with self.lock:
+                return self.cooccurrence.tag_counts(selected_tags[0] if selected_tags else None)
+
+        items = self.items
+        filtered_items = [
+            item for item in items
+            if all(tag in item['tags'] for tag in selected_tags)
+        ] if selected_tags else items
+
+        tag_counts = defaultdict(int)
+        for item in filtered_items:
+            for tag in item['tags']:
+                tag_counts[tag] += 1
+        return tag_counts
+
+    def related_tags(self, tags, limit=10):
+        """Tags most often used together with the given tags, as (tag, items in common) pairs"""
+        with self.lock:
+            return self.cooccurrence.related(tags, limit)
+
+    def find_duplicates(self):
+        """Groups of likely duplicate items, as lists of items.
+
+        The duplicate index is updated in the background after every load, only
+        for the items that changed since; this waits for that update if needed.
+        """
+        items = self.items  # A data refresh swaps in a new list
+        self.duplicates.update(items)
+        items_by_id = {item['id']: item for item in items}
+        groups = []
+        for group in self.duplicates.groups():
+            # Another request may have synced the index with a newer refresh in the meantime
+            group_items = [items_by_id[item_id] for item_id in group['items'] if item_id in items_by_id]
+            if len(group_items) > 1:
+                groups.append({'score': group['score'], 'items': group_items})
+        return groups
+
+    def add_tag_to_items(self, tag_name, item_ids):
+        """Add a tag to items; return the IDs of items that didn't have it yet"""
+        changed = []
+        with self.lock:
+            for item_id in item_ids:
+                item = self.items_by_id.get(item_id)
+                if item is not None and tag_name not in item['tags']:
+                    self.cooccurrence.add(tag_name, item['tags'])
+                    item['tags'].append(tag_name)
+                    changed.append(item_id)
+            if changed:
+                self.generation += 1
+                self.writer.add(tag_name, changed)
+                self.broker.publish('items_retagged', {'tag': tag_name, 'added': changed})
+                self.publish_tag_counts([tag_name])
+        return changed
+
+    def remove_tag_from_items(self, tag_name, item_ids):
+        """Remove a tag from items; return the IDs of items that had it"""
+        changed = []
+        with self.lock:
+            for item_id in item_ids:
+                item = self.items_by_id.get(item_id)
+                if item is not None and tag_name in item['tags']:
+                    item['tags'].remove(tag_name)
+                    self.cooccurrence.remove(tag_name, item['tags'])
+                    changed.append(item_id)
+            if changed:
+                self.generation += 1
+                self.writer.remove(tag_name, changed)
+                self.broker.publish('items_retagged', {'tag': tag_name, 'removed': changed})
+                self.publish_tag_counts([tag_name])
+        return changed
+
+    def remove_tag_from_item(self, tag_name, item_id):
+        """Remove a tag from an item; return False if the item doesn't have it"""
+        return bool(self.remove_tag_from_items(tag_name, [item_id]))
+
+    def rename_tag(self, old_tag_name, new_tag_name):
+        """Rename a tag on all items, merging into the new tag if it exists; return False if unused"""
+        if old_tag_name == new_tag_name:
+            # Nothing to do, and the writer would take it for a merge into itself and delete the tag
+            return False
+        with self.lock:
+            items_with_old_tag = [item for item in self.items if old_tag_name in item['tags']]
+            if not items_with_old_tag:
+                return False
+            for item in items_with_old_tag:
+                item['tags'].remove(old_tag_name)
+                self.cooccurrence.remove(old_tag_name, item['tags'])
+                if new_tag_name not in item['tags']:
+                    self.cooccurrence.add(new_tag_name, item['tags'])
+                    item['tags'].append(new_tag_name)
+            self.generation += 1
+            self.writer.rename(old_tag_name, new_tag_name, self.library_id)
+            self.broker.publish('tag_renamed', {
+                'old': old_tag_name,
+                'new': new_tag_name,
+                'items': [item['id'] for item in items_with_old_tag]
+            })
+            self.publish_tag_counts([old_tag_name, new_tag_name])
+        return True
+
+    def publish_tag_counts(self, tag_names):
+        """Publish the library-wide counts of the given tags (0 means the tag is gone)"""
+        counts = {tag_name: self.cooccurrence.counts.get(tag_name, 0) for tag_name in tag_names}
+        self.broker.publish('tag_counts', {'counts': counts})
+
+
+class LibraryManager:
+    """Registry of the served libraries.
+
+    Libraries are loaded on first access. When the estimated size of the
+    loaded libraries exceeds the memory budget, the least recently used
+    libraries that no request is currently using are unloaded.
+    """
+
+    def __init__(self, memory_budget=None, load_workers=None, flush_delay=0.2):
+        self.memory_budget = memory_budget  # In bytes, None for no limit
+        self.load_workers = load_workers
+        self.flush_delay = flush_delay
+        self.libraries = OrderedDict()
+        self.writers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def default_key(self):
+        return next(iter(self.libraries), None)
+
+    def add_database(self, database_path):
+        """Register every library of a database, keyed '<file name>' for the user library
+        and '<file name>-group-<libraryID>' for group libraries"""
+        stem = os.path.splitext(os.path.basename(database_path))[0] or 'zotero'
+        prefix, n = stem, 1
+        while any(key == prefix or key.startswith(prefix + '-group-') for key in self.libraries):
+            n += 1
+            prefix = f"{stem}-{n}"
+
+        writer = TagWriter(
+            database_path, flush_delay=self.flush_delay,
+            # Tag changes the database rejected are still in memory, reload to match the database again
+            on_error=lambda error: self.invalidate_database(database_path)
+        )
+        self.writers[database_path] = writer
+        for library_id, library_type, name in discover_libraries(database_path):
+            key = prefix if library_type == 'user' else f"{prefix}-group-{library_id}"
+            self.libraries[key] = Library(key, name, database_path, library_id, writer, self.load_workers)
+
+    def invalidate_database(self, database_path):
+        """Mark the loaded libraries of a database to be reloaded on next access"""
+        for library in list(self.libraries.values()):
+            if library.database_path == database_path and library.loaded:
+                library.stale = True
+
+    def acquire(self, key):
+        """Mark a library as in use (loading it if needed); None if there is no such library"""
+        with self._lock:
+            library = self.libraries.get(key)
+            if library is None:
+                return None
+            library.in_use += 1
+            library.last_used = time.monotonic()
+        try:
+            library.ensure_loaded()
+        except Exception:
+            self.release(library)
+            raise
+        self.enforce_budget()
+        return library
+
+    def release(self, library):
+        with self._lock:
+            library.in_use -= 1
+
+    def total_size(self):
+        return sum(library.size for library in self.libraries.values() if library.loaded)
+
+    def enforce_budget(self):
+        """Unload idle libraries, least recently used first, until within the memory budget"""
+        if self.memory_budget is None:
+            return
+        with self._lock:
+            total = self.total_size()
+            if total <= self.memory_budget:
+                return
+            idle = sorted(
+                (library for library in self.libraries.values() if library.loaded and library.in_use == 0),
+                key=lambda library: library.last_used
+            )
+            for library in idle:
+                if total <= self.memory_budget:
+                    break
+                total -= library.size
+                print(f"Unloading library {library.key} to stay within the memory budget")
+                library.unload()
+
+    def status(self):
+        return {
+            'memory_budget_mb': round(self.memory_budget / 2**20, 1) if self.memory_budget else None,
+            'loaded_mb': round(self.total_size() / 2**20, 1),
+            'libraries': [library.status() for library in self.libraries.values()]
+        }
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
@@ -0,0 +1,201 @@
+"""Load the Zotero library into memory, running independent queries in parallel."""
+
+import sqlite3
+import os
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Item types that are not references: annotations, attachments and notes
+EXCLUDED_TYPES_SQL = "items.itemTypeID NOT IN (1, 14, 37)"
+
+
+def default_workers():
+    """Default loader pool size: one per query, bounded by the number of CPUs"""
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def connect_readonly(database_path):
+    """Open a read-only connection, so loader threads never take a write lock"""
+    uri = Path(database_path).resolve().as_uri() + '?mode=ro'
+    connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def format_date(date):
+    """Format Zotero's multipart date ('2020-05-00 2020-05') to a readable format"""
+    if not date:
+        return date
+    datestr = date.split(' ')[0]
+    Y, m, d = datestr.split('-')
+    if m == '00' and d == '00':
+        return Y
+    elif d == '00':
+        return f"{Y}-{m}"
+    else:
+        return f"{Y}-{m}-{d}"
+
+
+def load_item_fields(database_path, library_id):
+    """Retrieve basic item information (no authors or tags) keyed by item ID"""
+    connection = connect_readonly(database_path)
+    try:
+        query = f"""
+        SELECT
+            items.itemID,
+            items.itemTypeID,
+            itemTypes.typeName,
+            titleValues.value AS title,
+            dateValues.value AS date,
+            items.dateAdded,
+            publicationValues.value AS publication,
+            abstractValues.value AS abstract
+        FROM items
+        LEFT JOIN itemTypes ON items.itemTypeID = itemTypes.itemTypeID
+
+        -- Title field
+        LEFT JOIN fields titleField ON titleField.fieldName = 'title'
+        LEFT JOIN itemData titleData ON items.itemID = titleData.itemID AND titleData.fieldID = titleField.fieldID
+        LEFT JOIN itemDataValues titleValues ON titleData.valueID = titleValues.valueID
+
+        -- Date field (publication date)
+        LEFT JOIN itemData dateData ON items.itemID = dateData.itemID AND dateData.fieldID = 14
+        LEFT JOIN itemDataValues dateValues ON dateData.valueID = dateValues.valueID
+
+        -- Publication/Journal field
+        LEFT JOIN itemData pubData ON items.itemID = pubData.itemID AND pubData.fieldID = 12
+        LEFT JOIN itemDataValues publicationValues ON pubData.valueID = publicationValues.valueID
+
+        -- Abstract field
+        LEFT JOIN itemData abstractData ON items.itemID = abstractData.itemID AND abstractData.fieldID = 90
+        LEFT JOIN itemDataValues abstractValues ON abstractData.valueID = abstractValues.valueID
+
+        WHERE {EXCLUDED_TYPES_SQL} AND items.libraryID = ?
+        ORDER BY items.itemID
+        """
+        items = {}
+        for row in connection.execute(query, (library_id,)):
+            items[row['itemID']] = {
+                'id': row['itemID'],
+                'typeID': row['itemTypeID'],
+                'typeName': row['typeName'] or 'Unknown Type',
+                'title': row['title'] or 'Untitled',
+                'author': [],  # Filled in from the creators query
+                'date': format_date(row['date']) or 'No date',
+                # dateAdded is already stored as 2023-01-01 12:00:00, parsing and reformatting it was a no-op
+                'dateAdded': row['dateAdded'] or 'Unknown',
+                'publication': row['publication'] or '',
+                'abstract': row['abstract'] or '',  # Store abstract but don't display yet
+                'tags': [],  # Filled in from the tags query
+                'attachments': []  # Filled in from the attachments query
+            }
+        return items
+    finally:
+        connection.close()
+
+
+def load_item_tags(database_path, library_id):
+    """Retrieve tag names keyed by item ID"""
+    connection = connect_readonly(database_path)
+    try:
+        query = """
+        SELECT itemTags.itemID, tags.name
+        FROM itemTags
+        JOIN tags ON itemTags.tagID = tags.tagID
+        JOIN items ON itemTags.itemID = items.itemID
+        WHERE items.libraryID = ?
+        """
+        item_tags = defaultdict(list)
+        for item_id, tag_name in connection.execute(query, (library_id,)):
+            item_tags[item_id].append(tag_name)
+        return item_tags
+    finally:
+        connection.close()
+
+
+def load_item_creators(database_path, library_id):
+    """Retrieve formatted author names, in order, keyed by item ID"""
+    connection = connect_readonly(database_path)
+    try:
+        query = f"""
+        SELECT
+            items.itemID,
+            creators.firstName,
+            creators.lastName
+        FROM items
+        JOIN itemCreators ON items.itemID = itemCreators.itemID
+        JOIN creators ON itemCreators.creatorID = creators.creatorID
+        WHERE {EXCLUDED_TYPES_SQL} AND items.libraryID = ?
+        ORDER BY items.itemID, itemCreators.orderIndex
+        """
+        item_creators = defaultdict(list)
+        for item_id, first_name, last_name in connection.execute(query, (library_id,)):
+            first_name = first_name or ''
+            last_name = last_name or ''
+
+            # Format the author name based on available parts
+            if first_name and last_name:
+                author_name = f"{first_name} {last_name}"
+            elif last_name:
+                author_name = last_name
+            elif first_name:
+                author_name = first_name
+            else:
+                author_name = "Unknown author"
+
+            item_creators[item_id].append(author_name)
+        return item_creators
+    finally:
+        connection.close()
+
+
+def load_item_attachments(database_path, library_id):
+    """Retrieve attachment metadata keyed by parent item ID"""
+    connection = connect_readonly(database_path)
+    try:
+        query = """
+        SELECT itemAttachments.parentItemID, itemAttachments.path,
+               itemAttachments.contentType, itemAttachments.linkMode
+        FROM itemAttachments
+        JOIN items ON itemAttachments.parentItemID = items.itemID
+        WHERE items.libraryID = ?
+        """
+        item_attachments = defaultdict(list)
+        for parent_id, path, content_type, link_mode in connection.execute(query, (library_id,)):
+            item_attachments[parent_id].append({
+                'path': path,
+                'contentType': content_type,
+                'linkMode': link_mode
+            })
+        return item_attachments
+    finally:
+        connection.close()
+
+
+def get_items_and_tags(database_path, library_id=1, workers=None):
+    """Retrieve main items of a library with metadata, authors, tags and attachments.
+
+    The four queries are independent, so they run concurrently on a thread
+    pool, each on its own read-only connection, and are merged at the end.
+    """
+    workers = workers or default_workers()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zotero-viewer-loader') as pool:
+        fields_future = pool.submit(load_item_fields, database_path, library_id)
+        tags_future = pool.submit(load_item_tags, database_path, library_id)
+        creators_future = pool.submit(load_item_creators, database_path, library_id)
+        attachments_future = pool.submit(load_item_attachments, database_path, library_id)
+
+        items_dict = fields_future.result()
+        item_tags = tags_future.result()
+        item_creators = creators_future.result()
+        item_attachments = attachments_future.result()
+
+    for item_id, item in items_dict.items():
+        # Tags are unique per item in Zotero, but keep the list free of duplicates regardless
+        item['tags'] = list(dict.fromkeys(item_tags.get(item_id, ())))
+        # For items with no authors, set a default value
+        item['author'] = item_creators.get(item_id) or ['Unknown author']
+        item['attachments'] = item_attachments.get(item_id, [])
+
+    return list(items_dict.values())
@@ -0,0 +1,440 @@
+"""Concurrent load test of the web app against a generated database.
+
+Run with `python -m zotero_viewer.loadtest --help`. The app is served in
+process (threaded, like `app.run`) against a freshly generated Zotero-like
+database, N clients replay a weighted mix of requests, and the throughput
+and latency percentiles of every route are reported.
+
+Each client tags items with tags of its own (`loadtest/c<n>/...`), so it
+knows exactly which items must carry them and checks every response that
+shows them (tag counts, item details, filtered pages). At the end the
+database is checked against the same expectations once the background
+writer has drained, and the app's tag counts against the database.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+import click
+
+# Route label -> weight in the default request mix
+DEFAULT_MIX = 'index=30,details=30,tags=10,add=15,remove=10,rename=5'
+
+ROUTES = {
+    'index': '/',
+    'details': '/get_item_details',
+    'tags': '/api/tags',
+    'add': '/add_tags',
+    'remove': '/remove_tag_batch',
+    'rename': '/rename_tag',
+}
+
+TAG_PREFIX = 'loadtest/'
+
+
+def make_database(path, n_items=5000, n_tags=300, seed=0):
+    """Generate a database with the subset of the Zotero schema the app uses"""
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE libraries (libraryID INTEGER PRIMARY KEY, type TEXT NOT NULL);
+        CREATE TABLE groups (groupID INTEGER PRIMARY KEY, libraryID INT NOT NULL UNIQUE, name TEXT NOT NULL);
+        CREATE TABLE itemTypes (itemTypeID INTEGER PRIMARY KEY, typeName TEXT);
+        CREATE TABLE items (itemID INTEGER PRIMARY KEY, itemTypeID INT NOT NULL, dateAdded TEXT NOT NULL,
+                            libraryID INT NOT NULL, key TEXT NOT NULL);
+        CREATE TABLE fields (fieldID INTEGER PRIMARY KEY, fieldName TEXT);
+        CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value UNIQUE);
+        CREATE TABLE itemData (itemID INT, fieldID INT, valueID INT, PRIMARY KEY (itemID, fieldID));
+        CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE itemTags (itemID INT NOT NULL, tagID INT NOT NULL, type INT NOT NULL,
+                               PRIMARY KEY (itemID, tagID));
+        CREATE TABLE creators (creatorID INTEGER PRIMARY KEY, firstName TEXT, lastName TEXT);
+        CREATE TABLE creatorTypes (creatorTypeID INTEGER PRIMARY KEY, creatorType TEXT);
+        CREATE TABLE itemCreators (itemID INT NOT NULL, creatorID INT NOT NULL, creatorTypeID INT NOT NULL,
+                                   orderIndex INT NOT NULL DEFAULT 0, PRIMARY KEY (itemID, creatorID, creatorTypeID, orderIndex));
+        CREATE TABLE itemAttachments (itemID INTEGER PRIMARY KEY, parentItemID INT, linkMode INT,
+                                      contentType TEXT, path TEXT);
+        INSERT INTO libraries VALUES (1, 'user');
+        INSERT INTO itemTypes VALUES (1, 'annotation'), (2, 'book'), (14, 'attachment'),
+                                     (22, 'journalArticle'), (37, 'note');
+        INSERT INTO fields VALUES (1, 'title'), (12, 'publicationTitle'), (14, 'date'), (90, 'abstractNote');
+        INSERT INTO creatorTypes VALUES (1, 'author');
+        """)
+
+    words = ('neural visual attention memory cortex model learning signal network decision '
+             'perception motor spatial temporal dynamics coding response task bayesian').split()
+    conn.executemany("INSERT INTO tags (tagID, name) VALUES (?, ?)",
+                     [(tag_id, f"{rnd.choice(words)}/{tag_id}") for tag_id in range(1, n_tags + 1)])
+    conn.executemany("INSERT INTO creators VALUES (?, ?, ?)",
+                     [(creator_id, 'Ann', f"Author{creator_id}") for creator_id in range(1, n_items // 5 + 2)])
+
+    values = {}
+
+    def value_id(value):
+        if value not in values:
+            values[value] = len(values) + 1
+        return values[value]
+
+    items, item_data, item_tags, item_creators = [], [], [], []
+    for item_id in range(1, n_items + 1):
+        items.append((item_id, rnd.choice((2, 22)), f"20{rnd.randint(10, 24)}-01-01 10:00:00", 1, f"LT{item_id:06d}"))
+        title = ' '.join(rnd.choice(words) for _ in range(rnd.randint(4, 10))).capitalize()
+        year = rnd.randint(1990, 2024)
+        item_data += [
+            (item_id, 1, value_id(title)),
+            (item_id, 14, value_id(f"{year}-00-00 {year}")),
+            (item_id, 12, value_id(f"Journal of {rnd.choice(words).capitalize()}")),
+            (item_id, 90, value_id(' '.join(rnd.choice(words) for _ in range(60)))),
+        ]
+        # Skewed tag usage, like real libraries
+        for tag_id in {min(n_tags, int(rnd.paretovariate(0.8))) for _ in range(rnd.randint(0, 8))}:
+            item_tags.append((item_id, tag_id, 0))
+        for order, creator_id in enumerate(rnd.sample(range(1, n_items // 5 + 2), rnd.randint(1, 3))):
+            item_creators.append((item_id, creator_id, 1, order))
+
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?)", items)
+    conn.executemany("INSERT INTO itemDataValues VALUES (?, ?)", [(v, k) for k, v in values.items()])
+    conn.executemany("INSERT INTO itemData VALUES (?, ?, ?)", item_data)
+    conn.executemany("INSERT INTO itemTags VALUES (?, ?, ?)", item_tags)
+    conn.executemany("INSERT INTO itemCreators VALUES (?, ?, ?, ?)", item_creators)
+    conn.commit()
+    conn.close()
+
+
+def parse_mix(mix):
+    """Parse 'index=30,details=30,...' into a {route label: weight} dict"""
+    weights = {}
+    for part in mix.split(','):
+        label, _, weight = part.partition('=')
+        label = label.strip()
+        if label not in ROUTES:
+            raise click.BadParameter(f'Unknown route "{label}", expected one of {", ".join(ROUTES)}')
+        try:
+            weights[label] = float(weight)
+        except ValueError:
+            raise click.BadParameter(f'Invalid weight for "{label}"')
+    if not any(weight > 0 for weight in weights.values()):
+        raise click.BadParameter('At least one route needs a positive weight')
+    return weights
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Latencies, request errors and consistency errors collected by all clients"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_messages = []
+        self.inconsistencies = []
+        self.lock = threading.Lock()
+
+    def record(self, label, seconds, error=None):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            if error is not None:
+                self.errors[label] += 1
+                self.error_messages.append(error)
+
+    def inconsistent(self, message):
+        with self.lock:
+            self.inconsistencies.append(message)
+
+
+class Client:
+    """One simulated user, replaying random requests from the mix"""
+
+    def __init__(self, number, base_url, item_ids, seed_tags, weights, recorder, seed=None):
+        self.number = number
+        self.base_url = base_url
+        self.item_ids = item_ids
+        self.seed_tags = seed_tags
+        self.labels = list(weights)
+        self.weights = [weights[label] for label in self.labels]
+        self.recorder = recorder
+        self.rnd = random.Random(seed)
+        self.prefix = f"{TAG_PREFIX}c{number}/"
+        self.renames = 0
+        # The client's own tags: name -> IDs of the items that must carry it
+        self.expected = {f"{self.prefix}t{n}": set() for n in range(5)}
+
+    def run(self, requests):
+        for _ in range(requests):
+            label = self.rnd.choices(self.labels, self.weights)[0]
+            getattr(self, f"do_{label}")()
+
+    # HTTP
+
+    def request(self, label, path, form=None, payload=None):
+        """Send a request and time it; return the parsed JSON (or text) or None on error"""
+        data, headers = None, {}
+        if form is not None:
+            data = urllib.parse.urlencode(form, doseq=True).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.base_url + path, data, headers), timeout=60) as response:
+                body = response.read().decode('utf-8')
+                content_type = response.headers.get('Content-Type', '')
+        except Exception as e:
+            # HTTP error statuses end up here too
+            self.recorder.record(label, time.perf_counter() - started, f"{path}: {e}")
+            return None
+        seconds = time.perf_counter() - started
+
+        result = json.loads(body) if 'json' in content_type else body
+        if isinstance(result, dict) and result.get('success') is False:
+            self.recorder.record(label, seconds, f"{path}: {result.get('message')}")
+        else:
+            self.recorder.record(label, seconds)
+        return result
+
+    def check(self, condition, message):
+        if not condition:
+            self.recorder.inconsistent(f"client {self.number}: {message}")
+
+    def check_counts(self, route, tag_counts):
+        """Tag counts reported by the app must match the client's own tags exactly"""
+        for tag, item_ids in self.expected.items():
+            self.check(tag_counts.get(tag, 0) == len(item_ids),
+                       f"{route} reports {tag_counts.get(tag, 0)} items for {tag}, expected {len(item_ids)}")
+        for tag in tag_counts:
+            if tag.startswith(self.prefix) and tag not in self.expected:
+                self.check(False, f"{route} reports stale tag {tag}")
+
+    def own_tag(self, non_empty=False):
+        tags = [tag for tag, item_ids in self.expected.items() if item_ids or not non_empty]
+        return self.rnd.choice(tags) if tags else None
+
+    # Requests
+
+    def do_index(self):
+        tag = self.own_tag(non_empty=True) if self.rnd.random() < 0.3 else None
+        if tag is not None:
+            html = self.request('index', '/?' + urllib.parse.urlencode({'tag': tag}))
+            if html is not None:
+                match = re.search(r'<span id="item-count">(\d+)</span>', html)
+                self.check(match and int(match.group(1)) == len(self.expected[tag]),
+                           f"/ filtered by {tag} lists {match.group(1) if match else '?'} items, "
+                           f"expected {len(self.expected[tag])}")
+        else:
+            tags = self.rnd.sample(self.seed_tags, self.rnd.randint(1, 2))
+            self.request('index', '/?' + urllib.parse.urlencode({'tag': tags}, doseq=True))
+
+    def do_details(self):
+        tagged = set().union(*self.expected.values())
+        if tagged and self.rnd.random() < 0.5:
+            item_id = self.rnd.choice(sorted(tagged))
+        else:
+            item_id = self.rnd.choice(self.item_ids)
+        result = self.request('details', f"/get_item_details/{item_id}")
+        if isinstance(result, dict) and result.get('success'):
+            own_tags = {tag for tag in result['item']['tags'] if tag.startswith(self.prefix)}
+            expected = {tag for tag, item_ids in self.expected.items() if item_id in item_ids}
+            self.check(own_tags == expected,
+                       f"item {item_id} has tags {sorted(own_tags)}, expected {sorted(expected)}")
+
+    def do_tags(self):
+        result = self.request('tags', '/api/tags')
+        if isinstance(result, dict):
+            if 'counts' in result:
+                self.check_counts('/api/tags', result['counts'])
+            else:
+                tags = set(result['tags'])
+                for tag, item_ids in self.expected.items():
+                    self.check((tag in tags) == bool(item_ids), f"/api/tags is wrong about {tag}")
+
+    def do_add(self):
+        tag = self.own_tag()
+        item_ids = self.rnd.sample(self.item_ids, self.rnd.randint(1, 5))
+        result = self.request('add', '/add_tags', form={'new_tag': tag, 'selected_items': item_ids})
+        if isinstance(result, dict) and result.get('success'):
+            self.expected[tag].update(item_ids)
+            self.check_counts('/add_tags', result['tag_counts'])
+
+    def do_remove(self):
+        tag = self.own_tag(non_empty=True)
+        if tag is None:
+            return self.do_add()
+        item_ids = self.rnd.sample(sorted(self.expected[tag]), min(len(self.expected[tag]), self.rnd.randint(1, 3)))
+        result = self.request('remove', '/remove_tag_batch', form={'tag_name': tag, 'item_ids': item_ids})
+        if isinstance(result, dict) and result.get('success'):
+            self.expected[tag].difference_update(item_ids)
+            self.check_counts('/remove_tag_batch', result['tag_counts'])
+
+    def do_rename(self):
+        old_tag = self.own_tag(non_empty=True)
+        if old_tag is None:
+            return self.do_add()
+        self.renames += 1
+        if self.rnd.random() < 0.2:
+            new_tag = self.own_tag()  # Merge into another own tag
+        else:
+            new_tag = f"{old_tag.rsplit('.', 1)[0]}.{self.renames}"
+        if new_tag == old_tag:
+            return
+        result = self.request('rename', '/rename_tag', payload={'old_tag_name': old_tag, 'new_tag_name': new_tag})
+        if isinstance(result, dict) and result.get('success'):
+            item_ids = self.expected.pop(old_tag)
+            self.expected.setdefault(new_tag, set()).update(item_ids)
+
+
+def fetch_json(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def check_database(database_path, clients, app_counts, recorder):
+    """Compare the written database with the clients' expectations and the app's tag counts"""
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    try:
+        written = defaultdict(set)
+        for tag, item_id in conn.execute("""
+                SELECT tags.name, itemTags.itemID FROM itemTags JOIN tags ON itemTags.tagID = tags.tagID
+                WHERE tags.name LIKE ?""", (TAG_PREFIX + '%',)):
+            written[tag].add(item_id)
+        db_counts = dict(conn.execute("""
+            SELECT tags.name, COUNT(*) FROM itemTags JOIN tags ON itemTags.tagID = tags.tagID
+            GROUP BY tags.name"""))
+    finally:
+        conn.close()
+
+    expected = {}
+    for client in clients:
+        expected.update({tag: item_ids for tag, item_ids in client.expected.items() if item_ids})
+    for tag in sorted(set(expected) | set(written)):
+        if expected.get(tag, set()) != written.get(tag, set()):
+            recorder.inconsistent(f"database: {tag} is on {len(written.get(tag, ()))} items, "
+                                  f"expected {len(expected.get(tag, ()))}")
+    for tag in sorted(set(db_counts) | set(app_counts)):
+        if db_counts.get(tag, 0) != app_counts.get(tag, 0):
+            recorder.inconsistent(f"database: {tag} is on {db_counts.get(tag, 0)} items, "
+                                  f"the app reports {app_counts.get(tag, 0)}")
+
+
+def print_report(recorder, elapsed):
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    click.echo(f"\n{total} requests in {elapsed:.1f} s ({total / elapsed:.1f} req/s)\n")
+    click.echo(f"{'route':<20}{'requests':>9}{'errors':>8}{'req/s':>9}"
+               f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for label, route in ROUTES.items():
+        latencies = sorted(recorder.latencies.get(label, []))
+        if not latencies:
+            continue
+        click.echo(
+            f"{route:<20}{len(latencies):>9}{recorder.errors.get(label, 0):>8}{len(latencies) / elapsed:>9.1f}"
+            + ''.join(f"{value * 1000:>9.1f}" for value in (
+                percentile(latencies, 0.50), percentile(latencies, 0.95),
+                percentile(latencies, 0.99), latencies[-1]))
+        )
+
+    for title, messages in (('Request errors', recorder.error_messages),
+                            ('Consistency errors', recorder.inconsistencies)):
+        click.echo(f"\n{title}: {len(messages)}")
+        for message in messages[:20]:
+            click.echo(f"  {message}")
+        if len(messages) > 20:
+            click.echo(f"  ... and {len(messages) - 20} more")
+
+
+@click.command()
+@click.option('--clients', default=8, help='Number of concurrent clients (default: 8)')
+@click.option('--requests', 'requests_per_client', default=200, help='Requests sent by each client (default: 200)')
+@click.option('--mix', default=DEFAULT_MIX, help=f'Weighted request mix (default: {DEFAULT_MIX})')
+@click.option('--items', 'n_items', default=5000, help='Number of items in the generated database (default: 5000)')
+@click.option('--tags', 'n_tags', default=300, help='Number of tags in the generated database (default: 300)')
+@click.option('--seed', default=0, help='Random seed for the database and the clients (default: 0)')
+@click.option('--flush-delay', default=0.2, help='Flush delay of the tag writer (default: 0.2)')
+@click.option('--keep', is_flag=True, help='Keep the generated database and print its path')
+def main(clients, requests_per_client, mix, n_items, n_tags, seed, flush_delay, keep):
+    """Load test Zotero Viewer with concurrent clients and report latency percentiles per route.
+
+    Exits with status 1 if any request failed or any data consistency error was observed.
+    """
+    from werkzeug.serving import make_server
+    from . import app as app_module
+    from .library import LibraryManager
+
+    weights = parse_mix(mix)
+    directory = tempfile.mkdtemp(prefix='zotero-viewer-loadtest-')
+    database_path = os.path.join(directory, 'zotero.sqlite')
+    click.echo(f"Generating a database with {n_items} items and {n_tags} tags...")
+    make_database(database_path, n_items, n_tags, seed)
+
+    app_module.libraries = LibraryManager(flush_delay=flush_delay)
+    app_module.libraries.add_database(database_path)
+    library = app_module.libraries.acquire(app_module.libraries.default_key)
+    item_ids = sorted(library.items_by_id)
+    seed_tags = sorted(tag for tag in library.get_tag_counts([]) if not tag.startswith(TAG_PREFIX))
+    app_module.libraries.release(library)
+
+    # Same threaded server as app.run, on a free port, without logging every request
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    recorder = Recorder()
+    simulated = [Client(n, base_url, item_ids, seed_tags, weights, recorder, seed=seed * 1000 + n)
+                 for n in range(clients)]
+    threads = [threading.Thread(target=client.run, args=(requests_per_client,)) for client in simulated]
+    click.echo(f"Running {clients} clients x {requests_per_client} requests against {base_url}...")
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    try:
+        # Let the background writer drain, then compare the database with what the clients saw
+        deadline = time.monotonic() + 60
+        while True:
+            write_status = fetch_json(base_url + '/api/write_status')
+            if write_status['queue_depth'] == 0 or time.monotonic() > deadline:
+                break
+            time.sleep(0.1)
+        if write_status['queue_depth']:
+            recorder.inconsistent(f"writer: {write_status['queue_depth']} tag changes still pending")
+        if write_status['last_flush'] and write_status['last_flush']['status'] == 'error':
+            recorder.inconsistent(f"writer: last flush failed: {write_status['last_flush']['error']}")
+        check_database(database_path, simulated, fetch_json(base_url + '/api/tags').get('counts', {}), recorder)
+    finally:
+        server.shutdown()
+        app_module.libraries.close()
+
+    print_report(recorder, elapsed)
+    if keep:
+        click.echo(f"\nDatabase kept at {database_path}")
+    else:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    failed = sum(recorder.errors.values()) or recorder.inconsistencies
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 // Function to open PDF attachments
 function openAttachment(itemId) {
-    fetch(`/get_attachment/${itemId}`)
+    fetch(apiUrl(`/get_attachment/${itemId}`))
         .then(response => response.json())
         .then(data => {
             if (data.success) {
@@ -9,7 +9,7 @@ function highlightItem(element, itemId) {
     element.classList.add('highlighted');
     
     // Fetch item details
-    fetch(`/get_item_details/${itemId}`)
+    fetch(apiUrl(`/get_item_details/${itemId}`))
         .then(response => response.json())
         .then(data => {
             if (data.success) {
@@ -0,0 +1,97 @@
+// Show groups of likely duplicate references in the details panel
+
+function escapeDuplicateText(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Highlight a reference of a group if it is on the current page
+function showDuplicateItem(itemId) {
+    const checkbox = document.getElementById(`item_${itemId}`);
+    if (!checkbox) {
+        showFlashMessage('This reference is hidden by the current tag filters', 'error');
+        return;
+    }
+    const itemEl = checkbox.closest('.item');
+    itemEl.scrollIntoView({ behavior: 'smooth', block: 'center' });
+    highlightItem(itemEl, itemId);
+}
+
+// Select the references of a group that are on the current page, e.g. to tag them
+function selectDuplicateGroup(itemIds) {
+    document.querySelectorAll('input[name="selected_items"]').forEach(checkbox => {
+        checkbox.checked = itemIds.includes(parseInt(checkbox.value));
+    });
+    updateCommonTags();
+}
+
+function displayDuplicates(groups) {
+    const detailsContainer = document.getElementById('item-details-content');
+
+    if (groups.length === 0) {
+        detailsContainer.innerHTML = '<p class="select-message">No duplicates found</p>';
+        return;
+    }
+
+    detailsContainer.innerHTML = `
+        <div class="detail-title">Possible Duplicates (${groups.length})</div>
+        ${groups.map(group => `
+            <div class="duplicate-group">
+                <div class="duplicate-group-header">
+                    <span class="duplicate-score">Title similarity ${Math.round(group.score * 100)}%</span>
+                    <button type="button" class="refresh-button select-duplicates" data-item-ids="${group.items.map(item => item.id).join(',')}">
+                        Select
+                    </button>
+                </div>
+                ${group.items.map(item => `
+                    <div class="duplicate-item" data-item-id="${item.id}">
+                        <div class="duplicate-title">${escapeDuplicateText(item.title)}</div>
+                        <div class="duplicate-metadata">
+                            ${escapeDuplicateText(item.author.join(', '))} | ${escapeDuplicateText(item.date)}
+                            ${item.publication ? ' | ' + escapeDuplicateText(item.publication) : ''}
+                        </div>
+                    </div>
+                `).join('')}
+            </div>
+        `).join('')}
+    `;
+
+    detailsContainer.querySelectorAll('.duplicate-item').forEach(itemEl => {
+        itemEl.addEventListener('click', function() {
+            showDuplicateItem(parseInt(itemEl.getAttribute('data-item-id')));
+        });
+    });
+    detailsContainer.querySelectorAll('.select-duplicates').forEach(button => {
+        button.addEventListener('click', function() {
+            selectDuplicateGroup(button.getAttribute('data-item-ids').split(',').map(Number));
+        });
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const duplicatesButton = document.getElementById('duplicates-button');
+    if (!duplicatesButton) return;
+
+    duplicatesButton.addEventListener('click', function() {
+        document.querySelectorAll('.item').forEach(item => {
+            item.classList.remove('highlighted');
+        });
+        document.getElementById('item-details-content').innerHTML =
+            '<p class="select-message">Looking for duplicates...</p>';
+
+        fetch(apiUrl('/api/duplicates'))
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    displayDuplicates(data.groups);
+                } else {
+                    showFlashMessage(data.message || 'Error finding duplicates', 'error');
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                showFlashMessage('Network error while finding duplicates', 'error');
+            });
+    });
+});
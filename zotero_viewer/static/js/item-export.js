@@ -0,0 +1,27 @@
+// Export the references matching the current tag filters and search
+document.addEventListener('DOMContentLoaded', function() {
+    const exportButton = document.getElementById('export-button');
+    const exportFormat = document.getElementById('export-format');
+    
+    if (!exportButton || !exportFormat) return;
+    
+    exportButton.addEventListener('click', function() {
+        const params = new URLSearchParams();
+        params.append('format', exportFormat.value);
+        
+        // Same tag filters as the current page
+        const selectedTags = new URLSearchParams(window.location.search).getAll('tag');
+        selectedTags.forEach(tag => {
+            params.append('tag', tag);
+        });
+        
+        // Same search terms as the item search
+        const searchInput = document.getElementById('item-search');
+        if (searchInput && searchInput.value.trim()) {
+            params.append('q', searchInput.value.trim());
+        }
+        
+        // The server streams the file, let the browser download it
+        window.location.href = apiUrl(`/export?${params.toString()}`);
+    });
+});
@@ -159,6 +159,11 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Re-apply the current sort when the items are replaced by live updates
+    document.addEventListener('itemsreplaced', function() {
+        sortItems(currentSort.field, currentSort.direction);
+    });
+    
     // Apply default sort on page load (dateAdded, desc)
     updateSortUI('dateAdded', 'desc');
     sortItems('dateAdded', 'desc');
@@ -0,0 +1,282 @@
+// Live updates pushed by the server (server-sent events)
+// Changes made in other tabs (or by other people) are applied to this page in place.
+
+// Last generation applied to this page
+let lastGeneration = 0;
+
+// Get the tag names of an item element
+function getItemTagNames(itemEl) {
+    return Array.from(itemEl.querySelectorAll('.item-tags .tag'))
+        .map(tagEl => tagEl.childNodes[0].textContent.trim());
+}
+
+// Add a tag to an item element if it doesn't have it yet
+function addTagToItemElement(itemEl, tagName) {
+    if (getItemTagNames(itemEl).includes(tagName)) return;
+
+    const itemId = itemEl.getAttribute('data-item-id');
+    const tagSpan = document.createElement('span');
+    tagSpan.className = 'tag';
+    tagSpan.appendChild(document.createTextNode(tagName));
+
+    const closeButton = document.createElement('button');
+    closeButton.type = 'button';
+    closeButton.className = 'close-tag';
+    closeButton.title = 'Remove tag';
+    closeButton.innerHTML = '&times;';
+    closeButton.addEventListener('click', function(event) {
+        removeTag(tagName, itemId, event);
+    });
+    tagSpan.appendChild(closeButton);
+
+    itemEl.querySelector('.item-tags').appendChild(tagSpan);
+}
+
+// Remove a tag from an item element
+function removeTagFromItemElement(itemEl, tagName) {
+    itemEl.querySelectorAll('.item-tags .tag').forEach(tagEl => {
+        if (tagEl.childNodes[0].textContent.trim() === tagName) {
+            tagEl.remove();
+        }
+    });
+}
+
+// Recount tags over the items on this page and redraw the tag cloud
+function recountTagCloud() {
+    const tagCounts = {};
+    document.querySelectorAll('.item').forEach(itemEl => {
+        getItemTagNames(itemEl).forEach(tagName => {
+            tagCounts[tagName] = (tagCounts[tagName] || 0) + 1;
+        });
+    });
+    updateTagCloudWithSearchContext(tagCounts);
+}
+
+// Refresh the details panel if the highlighted item is among the changed items
+function refreshHighlightedItem(itemIds) {
+    const highlightedItem = document.querySelector('.item.highlighted');
+    if (!highlightedItem) return;
+
+    const highlightedItemId = highlightedItem.getAttribute('data-item-id');
+    if (!itemIds.map(String).includes(highlightedItemId)) return;
+
+    fetch(apiUrl(`/get_item_details/${highlightedItemId}`))
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                displayItemDetails(data.item);
+            }
+        })
+        .catch(error => {
+            console.error('Error refreshing item details:', error);
+        });
+}
+
+// Update the visible item count, taking an active search into account
+function refreshItemCount() {
+    const visibleItems = Array.from(document.querySelectorAll('.item'))
+        .filter(itemEl => itemEl.style.display !== 'none');
+    updateItemCount(visibleItems.length);
+}
+
+// Apply an items_retagged event: {tag, added: [ids]} or {tag, removed: [ids]}
+function applyItemsRetagged(data) {
+    const selectedTags = new URLSearchParams(window.location.search).getAll('tag');
+    const changedIds = data.added || data.removed;
+
+    if (data.added && selectedTags.includes(data.tag)) {
+        // Items that weren't on this page may match the tag filters now
+        refreshView();
+        return;
+    }
+
+    changedIds.forEach(itemId => {
+        const checkbox = document.getElementById(`item_${itemId}`);
+        if (!checkbox) return;
+        const itemEl = checkbox.closest('.item');
+
+        if (data.added) {
+            addTagToItemElement(itemEl, data.tag);
+        } else if (selectedTags.includes(data.tag)) {
+            // The item no longer matches the tag filters
+            itemEl.remove();
+        } else {
+            removeTagFromItemElement(itemEl, data.tag);
+        }
+    });
+
+    recountTagCloud();
+    refreshItemCount();
+    updateCommonTags();
+    refreshHighlightedItem(changedIds);
+}
+
+// Apply a tag_renamed event: {old, new, items: [ids]}
+function applyTagRename(data) {
+    const url = new URL(window.location.href);
+    const selectedTags = url.searchParams.getAll('tag');
+
+    if (selectedTags.includes(data.old) || selectedTags.includes(data.new)) {
+        // Keep the tag filters pointing at the renamed tag
+        const newTags = [...new Set(selectedTags.map(tag => tag === data.old ? data.new : tag))];
+        url.searchParams.delete('tag');
+        newTags.forEach(tag => url.searchParams.append('tag', tag));
+        window.history.replaceState(null, '', url.toString());
+        refreshView();
+        return;
+    }
+
+    data.items.forEach(itemId => {
+        const checkbox = document.getElementById(`item_${itemId}`);
+        if (!checkbox) return;
+        const itemEl = checkbox.closest('.item');
+        removeTagFromItemElement(itemEl, data.old);
+        addTagToItemElement(itemEl, data.new);
+    });
+
+    recountTagCloud();
+    updateCommonTags();
+    refreshHighlightedItem(data.items);
+}
+
+// Reload the items and the tag cloud of the current view without reloading the page
+let refreshInFlight = false;
+let refreshPending = false;
+function refreshView() {
+    if (refreshInFlight) {
+        refreshPending = true;
+        return;
+    }
+    refreshInFlight = true;
+
+    fetch(window.location.href)
+        .then(response => response.text())
+        .then(html => {
+            const newDoc = new DOMParser().parseFromString(html, 'text/html');
+
+            // Remember selection and highlight
+            const checkedIds = Array.from(document.querySelectorAll('input[name="selected_items"]:checked'))
+                .map(checkbox => checkbox.value);
+            const highlightedItem = document.querySelector('.item.highlighted');
+            const highlightedItemId = highlightedItem ? highlightedItem.getAttribute('data-item-id') : null;
+
+            // Swap in the new items
+            document.querySelector('.items-container').innerHTML = newDoc.querySelector('.items-container').innerHTML;
+            checkedIds.forEach(itemId => {
+                const checkbox = document.getElementById(`item_${itemId}`);
+                if (checkbox) checkbox.checked = true;
+            });
+            if (highlightedItemId) {
+                const checkbox = document.getElementById(`item_${highlightedItemId}`);
+                if (checkbox) checkbox.closest('.item').classList.add('highlighted');
+            }
+
+            // Re-attach the per-item handlers
+            document.querySelectorAll('input[name="selected_items"]').forEach(checkbox => {
+                checkbox.addEventListener('change', updateCommonTags);
+            });
+            // Drop the select-all handlers bound to the old item list before re-initializing
+            const selectAllCheckbox = document.getElementById('select-all-checkbox');
+            selectAllCheckbox.parentNode.replaceChild(selectAllCheckbox.cloneNode(true), selectAllCheckbox);
+            const selectAllLabel = document.querySelector('label[for="select-all-checkbox"]');
+            selectAllLabel.parentNode.replaceChild(selectAllLabel.cloneNode(true), selectAllLabel);
+            initializeSelectAllCheckbox();
+            initializeItemDoubleClickHandlers();
+            document.dispatchEvent(new Event('itemsreplaced'));
+
+            // Related tags are computed from the same data
+            const relatedTags = document.querySelector('.related-tags');
+            const newRelatedTags = newDoc.querySelector('.related-tags');
+            if (relatedTags && newRelatedTags) {
+                relatedTags.innerHTML = newRelatedTags.innerHTML;
+            }
+
+            // Rebuild the tag cloud from the server's counts
+            const tagCounts = {};
+            newDoc.querySelectorAll('#tag-cloud .tag').forEach(tagEl => {
+                const tagName = tagEl.textContent.trim().replace(/\s*\(\d+\)$/, '');
+                tagCounts[tagName] = parseInt(tagEl.getAttribute('data-count'));
+            });
+            updateTagCloud(tagCounts);
+
+            // Re-apply an active search, which also updates the item count and tag cloud
+            const searchInput = document.getElementById('item-search');
+            if (searchInput && searchInput.value.trim()) {
+                filterItems(searchInput.value.trim());
+            } else {
+                refreshItemCount();
+            }
+
+            updateCommonTags();
+        })
+        .catch(error => {
+            console.error('Error refreshing view:', error);
+        })
+        .finally(() => {
+            refreshInFlight = false;
+            if (refreshPending) {
+                refreshPending = false;
+                refreshView();
+            }
+        });
+}
+
+// Connect to the event stream
+function connectLiveUpdates() {
+    if (!window.EventSource) return;
+
+    lastGeneration = parseInt(document.body.getAttribute('data-generation')) || 0;
+    const source = new EventSource(apiUrl(`/events?since=${lastGeneration}`));
+
+    // Wrap a handler so that replayed or already applied generations are skipped
+    function handle(eventType, handler) {
+        source.addEventListener(eventType, function(e) {
+            const generation = parseInt(e.lastEventId);
+            if (generation && generation <= lastGeneration) return;
+            if (generation) lastGeneration = generation;
+            handler(JSON.parse(e.data));
+        });
+    }
+
+    handle('items_retagged', applyItemsRetagged);
+    handle('tag_renamed', applyTagRename);
+    handle('library_refreshed', () => refreshView());
+    handle('resync', () => refreshView());
+    // tag_counts are library-wide, listeners such as tag autocomplete use them
+    handle('tag_counts', data => {
+        document.dispatchEvent(new CustomEvent('tagcountschanged', { detail: data.counts }));
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    connectLiveUpdates();
+
+    // Refresh data without leaving the page
+    const refreshForm = document.getElementById('refresh-form');
+    if (refreshForm) {
+        refreshForm.addEventListener('submit', function(e) {
+            e.preventDefault();
+
+            fetch(refreshForm.action, {
+                method: 'POST',
+                body: new FormData(refreshForm),
+                headers: {
+                    'X-Requested-With': 'XMLHttpRequest'
+                }
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    showFlashMessage(data.message, 'success');
+                    // The library_refreshed event updates the view
+                } else {
+                    showFlashMessage(data.message || 'Error refreshing data', 'error');
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                showFlashMessage('Network error while refreshing data', 'error');
+            });
+        });
+    }
+});
@@ -1,3 +1,9 @@
+// Function to build the URL of a route of the current library
+// (the default library is served at the root, others under /library/<key>)
+function apiUrl(path) {
+    return (document.body.getAttribute('data-base-url') || '') + path;
+}
+
 // Function to toggle tag selection in the URL
 function toggleTag(tagName) {
     const url = new URL(window.location.href);
@@ -5,24 +5,91 @@ document.addEventListener('DOMContentLoaded', function() {
     
     if (!tagInput || !tagSuggestions) return;
     
-    // Store all tags from the database
+    // Store all tags from the database, with their item counts
     let allTags = [];
+    let tagCounts = {};
+    
+    // Co-occurrence scores of tags with the context (tags being added, tags of the selected items)
+    let relatedScores = {};
+    let relatedContextKey = '';
     
     // Fetch all tags from the server when the page loads
     fetchAllTags();
     
     // Function to fetch all tags from the server
     function fetchAllTags() {
-        fetch('/api/tags')
+        fetch(apiUrl('/api/tags'))
             .then(response => response.json())
             .then(data => {
                 allTags = data.tags;
+                tagCounts = data.counts || {};
             })
             .catch(error => {
                 console.error('Error fetching tags:', error);
             });
     }
     
+    // Keep the tag list up to date with changes pushed by the server
+    document.addEventListener('tagcountschanged', function(e) {
+        Object.entries(e.detail).forEach(([tag, count]) => {
+            tagCounts[tag] = count;
+            if (count === 0) {
+                allTags = allTags.filter(existingTag => existingTag !== tag);
+            } else if (!allTags.includes(tag)) {
+                allTags.push(tag);
+                allTags.sort();
+            }
+        });
+    });
+    
+    // Tags the suggestions should relate to: tags already typed, tags of the selected items and the tag filters
+    function getContextTags() {
+        const contextTags = new Set();
+        tagInput.value.split(/[,;]/).slice(0, -1).forEach(tag => {
+            if (tag.trim()) contextTags.add(tag.trim());
+        });
+        document.querySelectorAll('input[name="selected_items"]:checked').forEach(checkbox => {
+            checkbox.closest('.item').querySelectorAll('.item-tags .tag').forEach(tagEl => {
+                contextTags.add(tagEl.childNodes[0].textContent.trim());
+            });
+        });
+        new URLSearchParams(window.location.search).getAll('tag').forEach(tag => contextTags.add(tag));
+        return [...contextTags].sort();
+    }
+    
+    // Fetch the co-occurrence scores for the current context (only when it changed)
+    function updateRelatedScores() {
+        const contextTags = getContextTags();
+        const contextKey = contextTags.join('\n');
+        if (contextKey === relatedContextKey) return;
+        relatedContextKey = contextKey;
+        
+        if (contextTags.length === 0) {
+            relatedScores = {};
+            return;
+        }
+        
+        const params = new URLSearchParams();
+        contextTags.forEach(tag => params.append('tag', tag));
+        params.append('limit', 100);
+        fetch(apiUrl(`/api/related_tags?${params.toString()}`))
+            .then(response => response.json())
+            .then(data => {
+                if (contextKey !== relatedContextKey) return;  // Context changed in the meantime
+                relatedScores = {};
+                data.related.forEach(entry => {
+                    relatedScores[entry.tag] = entry.count;
+                });
+                // Re-rank the suggestions on display
+                if (tagSuggestions.style.display === 'block') {
+                    showSuggestions(currentInput);
+                }
+            })
+            .catch(error => {
+                console.error('Error fetching related tags:', error);
+            });
+    }
+    
     // Current input state
     let currentInput = '';
     let selectedSuggestionIndex = -1;
@@ -53,6 +120,14 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
+        // Rank tags used together with the context first, then prefix matches, then common tags
+        matchingTags.sort((a, b) =>
+            (relatedScores[b] || 0) - (relatedScores[a] || 0) ||
+            b.toLowerCase().startsWith(inputLower) - a.toLowerCase().startsWith(inputLower) ||
+            (tagCounts[b] || 0) - (tagCounts[a] || 0) ||
+            a.localeCompare(b)
+        );
+        
         // Add matching tags to suggestions
         matchingTags.forEach((tag, index) => {
             const suggestion = document.createElement('div');
@@ -129,7 +204,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Update current input
         currentInput = currentTag;
         
-        // Show suggestions
+        // Show suggestions, re-ranked once the related tags of a new context arrive
+        updateRelatedScores();
         showSuggestions(currentTag);
     });
     
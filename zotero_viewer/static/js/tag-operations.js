@@ -76,7 +76,7 @@ function addTagsToSelected(event) {
     });
     
     // Use fetch API with FormData
-    fetch("/add_tags", {
+    fetch(apiUrl("/add_tags"), {
         method: 'POST',
         body: formData,
         headers: {
@@ -140,7 +140,7 @@ function addTagsToSelected(event) {
                     if (selectedItemIds.includes(highlightedItemId)) {
                         // Instead of manually updating the details panel, just re-fetch the item details
                         // This will use displayItemDetails which already handles duplicate tags
-                        fetch(`/get_item_details/${highlightedItemId}`)
+                        fetch(apiUrl(`/get_item_details/${highlightedItemId}`))
                             .then(response => response.json())
                             .then(data => {
                                 if (data.success) {
@@ -196,7 +196,7 @@ function removeTag(tagName, itemId, event) {
     });
     
     // Use fetch API with FormData
-    fetch("/remove_tag", {
+    fetch(apiUrl("/remove_tag"), {
         method: 'POST',
         body: formData
     })
@@ -324,7 +324,7 @@ function removeTagFromSelected(tagName) {
     });
     
     // Use fetch API with FormData
-    fetch("/remove_tag_batch", {
+    fetch(apiUrl("/remove_tag_batch"), {
         method: 'POST',
         body: formData
     })
@@ -413,7 +413,7 @@ function renameTag(oldTagName) {
     }
     
     // Send request to rename tag
-    fetch('/rename_tag', {
+    fetch(apiUrl('/rename_tag'), {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -426,8 +426,8 @@ function renameTag(oldTagName) {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            // Reload the page to show updated tags
-            window.location.reload();
+            showFlashMessage(data.message, 'success');
+            // The tag_renamed event updates this page (and every other open tab)
         } else {
             alert(data.message || 'Error renaming tag');
         }
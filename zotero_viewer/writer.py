@@ -0,0 +1,326 @@
+"""Background writer that applies tag mutations to the Zotero database."""
+
+import sqlite3
+import threading
+import time
+import random
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+
+ADD = 'add'
+REMOVE = 'remove'
+RENAME = 'rename'
+
+
+# Failed batches kept for /api/write_status
+MAX_FAILED_BATCHES = 10
+
+
+def is_busy_error(error):
+    """Return True if a sqlite error means another process holds the lock"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class TagWriter:
+    """Write-behind queue for tag mutations.
+
+    Mutations are acknowledged as soon as they are queued. A background thread
+    coalesces them and writes them in batched transactions, backing off and
+    retrying while the database is busy (e.g. when Zotero holds the lock).
+
+    Callers are expected to only queue mutations that actually change the
+    in-memory model, so that an add followed by a remove of the same
+    (tag, item) pair can safely cancel out.
+
+    A batch that fails for any other reason than a busy database is not
+    retried. It is kept for status reports and `on_error(error)` is called,
+    so that the owner can bring its in-memory model back in line with the
+    database.
+    """
+
+    def __init__(self, database_path, flush_delay=0.2, busy_timeout=1.0,
+                 initial_backoff=0.1, max_backoff=10.0, on_error=None):
+        self.database_path = database_path
+        self.flush_delay = flush_delay
+        self.busy_timeout = busy_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.on_error = on_error
+
+        # The queue is a list of segments. A segment is either an OrderedDict
+        # mapping (tag, item_id) to ADD/REMOVE, or a (RENAME, old, new, libraryID) tuple.
+        # Renames act as barriers so that pair operations never cross them.
+        self._queue = []
+        self._inflight = 0
+        self._closed = False
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self.last_flush = None
+        self.failed_operations = 0
+        self.failed_batches = []  # The most recent failed batches, oldest first
+
+        self._thread = threading.Thread(target=self._run, name='zotero-viewer-writer', daemon=True)
+        self._thread.start()
+
+    # Public API
+
+    def add(self, tag_name, item_ids):
+        """Queue adding a tag to items"""
+        self._queue_pairs(ADD, tag_name, item_ids)
+
+    def remove(self, tag_name, item_ids):
+        """Queue removing a tag from items"""
+        self._queue_pairs(REMOVE, tag_name, item_ids)
+
+    def rename(self, old_tag_name, new_tag_name, library_id):
+        """Queue renaming (or merging) a tag within a library"""
+        with self._cond:
+            self._check_open()
+            self._queue.append((RENAME, old_tag_name, new_tag_name, library_id))
+            self._cond.notify_all()
+
+    def queue_depth(self):
+        """Number of operations not yet committed to the database"""
+        with self._cond:
+            return self._count(self._queue) + self._inflight
+
+    def status(self):
+        """Queue depth, the outcome of the last flush attempt and the batches that could not be written"""
+        with self._cond:
+            return {
+                'queue_depth': self._count(self._queue) + self._inflight,
+                'last_flush': dict(self.last_flush) if self.last_flush else None,
+                'failed_operations': self.failed_operations,
+                'failed_batches': [dict(batch) for batch in self.failed_batches]
+            }
+
+    def flush(self, timeout=None):
+        """Block until every queued operation has been written; return False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._inflight:
+                # Cut the flush delay short, also for mutations queued while waiting
+                self._flush_requested = True
+                self._cond.notify_all()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=30):
+        """Drain the queue and stop the background thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    # Internals
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError('Tag writer is closed')
+
+    def _queue_pairs(self, op, tag_name, item_ids):
+        with self._cond:
+            self._check_open()
+            if not self._queue or not isinstance(self._queue[-1], OrderedDict):
+                self._queue.append(OrderedDict())
+            segment = self._queue[-1]
+            for item_id in item_ids:
+                key = (tag_name, item_id)
+                previous = segment.get(key)
+                if previous is not None and previous != op:
+                    # Add then remove (or remove then add) leaves the database unchanged
+                    del segment[key]
+                else:
+                    segment[key] = op
+            if not segment:
+                self._queue.pop()
+            self._cond.notify_all()
+
+    @staticmethod
+    def _count(segments):
+        return sum(len(segment) if isinstance(segment, OrderedDict) else 1 for segment in segments)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return  # Closed and fully drained
+                # Give further mutations a moment to arrive so they share a transaction.
+                # Enqueueing wakes this thread too, so wait out the full delay.
+                deadline = time.monotonic() + self.flush_delay
+                while not self._closed and not self._flush_requested:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_requested = False
+                batch, self._queue = self._queue, []
+                self._inflight = self._count(batch)
+
+            self._flush_batch(batch)
+
+            with self._cond:
+                self._inflight = 0
+                self._cond.notify_all()
+
+    def _flush_batch(self, batch):
+        operations = self._count(batch)
+        attempts = 0
+        backoff = self.initial_backoff
+        started = time.monotonic()
+        while True:
+            attempts += 1
+            try:
+                self._write(batch)
+                self._record('ok', operations, attempts, started)
+                return
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e):
+                    self._fail(batch, operations, attempts, started, e)
+                    return
+                # Database is locked, keep the batch and retry with jittered backoff
+                self._record('busy', operations, attempts, started, e)
+                time.sleep(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, self.max_backoff)
+            except sqlite3.Error as e:
+                self._fail(batch, operations, attempts, started, e)
+                return
+
+    def _record(self, status, operations, attempts, started, error=None):
+        with self._cond:
+            self.last_flush = {
+                'status': status,
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'operations': operations,
+                'attempts': attempts,
+                'duration_ms': round((time.monotonic() - started) * 1000, 1),
+                'error': str(error) if error else None
+            }
+
+    def _fail(self, batch, operations, attempts, started, error):
+        """Keep a batch that could not be written and tell the owner"""
+        self._record('error', operations, attempts, started, error)
+        print(f"Error writing {operations} tag changes, they are not in the database: {str(error)}")
+        with self._cond:
+            self.failed_operations += operations
+            self.failed_batches.append({
+                'time': self.last_flush['time'],
+                'error': str(error),
+                'operations': describe_batch(batch)
+            })
+            del self.failed_batches[:-MAX_FAILED_BATCHES]
+        if self.on_error is not None:
+            try:
+                self.on_error(error)
+            except Exception as e:
+                print(f"Error handling failed tag changes: {str(e)}")
+
+    def _write(self, batch):
+        conn = sqlite3.connect(self.database_path, timeout=self.busy_timeout)
+        try:
+            cursor = conn.cursor()
+            # Take the write lock up front so a busy database fails fast and cleanly
+            cursor.execute("BEGIN IMMEDIATE")
+            for segment in batch:
+                if isinstance(segment, OrderedDict):
+                    write_pairs(cursor, segment)
+                else:
+                    _, old_tag_name, new_tag_name, library_id = segment
+                    rename_tag(cursor, old_tag_name, new_tag_name, library_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def describe_batch(batch):
+    """List the operations of a batch as [op, tag, itemID] and [RENAME, old, new, libraryID]"""
+    operations = []
+    for segment in batch:
+        if isinstance(segment, OrderedDict):
+            operations.extend([op, tag_name, item_id] for (tag_name, item_id), op in segment.items())
+        else:
+            operations.append(list(segment))
+    return operations
+
+
+def get_tag_id(cursor, tag_name, create=False):
+    """Look up a tag ID by name, optionally creating the tag"""
+    cursor.execute("SELECT tagID FROM tags WHERE name = ?", (tag_name,))
+    result = cursor.fetchone()
+    if result:
+        return result[0]
+    if not create:
+        return None
+    cursor.execute("INSERT INTO tags (name) VALUES (?)", (tag_name,))
+    return cursor.lastrowid
+
+
+def write_pairs(cursor, segment):
+    """Write a coalesced segment of (tag, item) operations, one executemany per tag"""
+    adds = defaultdict(list)
+    removes = defaultdict(list)
+    for (tag_name, item_id), op in segment.items():
+        if op == ADD:
+            adds[tag_name].append(item_id)
+        else:
+            removes[tag_name].append(item_id)
+
+    for tag_name, item_ids in adds.items():
+        tag_id = get_tag_id(cursor, tag_name, create=True)
+        cursor.executemany(
+            "INSERT OR IGNORE INTO itemTags (itemID, tagID, type) VALUES (?, ?, 0)",
+            [(item_id, tag_id) for item_id in item_ids]
+        )
+
+    for tag_name, item_ids in removes.items():
+        tag_id = get_tag_id(cursor, tag_name)
+        if tag_id is None:
+            continue  # Tag doesn't exist, nothing to remove
+        cursor.executemany(
+            "DELETE FROM itemTags WHERE itemID = ? AND tagID = ?",
+            [(item_id, tag_id) for item_id in item_ids]
+        )
+
+
+def rename_tag(cursor, old_tag_name, new_tag_name, library_id):
+    """Rename a tag on the items of a library, merging it into the new tag if that already exists"""
+    old_tag_id = get_tag_id(cursor, old_tag_name)
+    if old_tag_id is None:
+        return False  # Old tag doesn't exist
+
+    # Tags are shared by all libraries of a database
+    cursor.execute("""
+        SELECT COUNT(*) FROM itemTags JOIN items ON itemTags.itemID = items.itemID
+        WHERE itemTags.tagID = ? AND items.libraryID != ?
+        """, (old_tag_id, library_id))
+    used_elsewhere = cursor.fetchone()[0] > 0
+
+    new_tag_id = get_tag_id(cursor, new_tag_name)
+    if new_tag_id is None and not used_elsewhere:
+        # New tag doesn't exist, simply rename the old tag
+        cursor.execute("UPDATE tags SET name = ? WHERE tagID = ?", (new_tag_name, old_tag_id))
+        return True
+
+    if new_tag_id is None:
+        new_tag_id = get_tag_id(cursor, new_tag_name, create=True)
+
+    # Move this library's items over to the new tag
+    library_items = "SELECT itemID FROM items WHERE libraryID = ?"
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO itemTags (itemID, tagID, type)
+        SELECT itemID, ?, 0 FROM itemTags WHERE tagID = ? AND itemID IN ({library_items})
+        """, (new_tag_id, old_tag_id, library_id))
+    cursor.execute(f"DELETE FROM itemTags WHERE tagID = ? AND itemID IN ({library_items})",
+                   (old_tag_id, library_id))
+    if not used_elsewhere:
+        cursor.execute("DELETE FROM tags WHERE tagID = ?", (old_tag_id,))
+    return True